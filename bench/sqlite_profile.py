@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+
+  Compares price ingest and latest price lookups of the default sqlite
+  settings with the tuned storage profile on a synthetic price table.
+
+  python bench/sqlite_profile.py [symbols] [days]
+"""
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli import storage  # noqa: E402
+
+SCHEMA = (
+    'CREATE TABLE "Symbol" (id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE "Price" (id INTEGER PRIMARY KEY, symbol INTEGER, '
+    'date DATETIME, open REAL, high REAL, low REAL, close REAL, volume REAL)',
+    'CREATE INDEX idx_price__symbol ON "Price" (symbol)',
+)
+
+
+def ingest(db_path, symbols, days, tuned, bulk):
+    con = sqlite3.connect(db_path)
+    if tuned:
+        storage.apply_pragmas(con)
+    for stmt in SCHEMA:
+        con.execute(stmt)
+    con.commit()
+    con.close()
+    if tuned and not bulk:
+        storage.create_indexes(db_path)
+    elif tuned:
+        storage.drop_indexes(db_path)
+    start = datetime.datetime(2015, 1, 1)
+    begin = time.perf_counter()
+    con = sqlite3.connect(db_path)
+    if tuned:
+        storage.apply_pragmas(con)
+    for sym in range(symbols):
+        con.execute(
+            'INSERT INTO "Symbol" (id, name) VALUES (?, ?)',
+            (sym, f'SYM{sym}.F'),
+        )
+        # pony commits once per symbol
+        for day in range(days):
+            date = start + datetime.timedelta(days=day)
+            con.execute(
+                'INSERT INTO "Price" (symbol, date, open, high, low, close, '
+                'volume) VALUES (?, ?, 1, 1, 1, ?, 1)',
+                (sym, date.strftime('%Y-%m-%d %H:%M:%S'), float(day)),
+            )
+        con.commit()
+    con.close()
+    if tuned and bulk:
+        storage.create_indexes(db_path)
+    return time.perf_counter() - begin
+
+
+def lookups(db_path, symbols, tuned):
+    con = sqlite3.connect(db_path)
+    if tuned:
+        storage.apply_pragmas(con)
+    begin = time.perf_counter()
+    for sym in range(symbols):
+        con.execute(
+            'SELECT p.close FROM "Price" p, "Symbol" s '
+            'WHERE p.symbol = s.id AND s.name = ? '
+            'ORDER BY p.date DESC LIMIT 1',
+            (f'SYM{sym}.F',),
+        ).fetchone()
+    con.close()
+    return time.perf_counter() - begin
+
+
+def main(symbols=500, days=1250):
+    for name, tuned, bulk in (
+        ('default', False, False),
+        ('tuned', True, False),
+        ('tuned bulk', True, True),
+    ):
+        with tempfile.TemporaryDirectory() as root:
+            db_path = os.path.join(root, 'full.sqlite')
+            ingest_time = ingest(db_path, symbols, days, tuned, bulk)
+            lookup_time = lookups(db_path, symbols, tuned)
+            print(
+                f'{name:>10}: ingest {ingest_time:6.2f}s '
+                f'latest price {lookup_time * 1000:8.1f}ms '
+                f'({symbols} symbols x {days} days)'
+            )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+
+  Compares allocations and peak memory of the previous sync payload
+  building with PayloadBuilder on synthetic stocks.
+
+  python bench/sync_payload.py [stocks]
+"""
+import datetime
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.payload import PayloadBuilder, StockDoc  # noqa: E402
+
+FILTERS = [
+    'StockIsHot2Month', 'StockIsHot3Month', 'StockIsHot6Month',
+    'SecureHotH2Month', 'SecureHotH3Month', 'SecureHotH6Month',
+    'SecureHot2Month', 'SecureHot3Month', 'SecureHot6Month',
+    'AdxP14', 'AdxP5', 'RsiP14', 'RsiP5', 'DividendKings',
+]
+BATCH = 400
+
+
+class Snapshot:
+    """
+    Stands in for a firestore document snapshot
+    """
+
+    def __init__(self, idx):
+        self.reference = f'stocks/{idx}'
+        self.idx = idx
+
+    def to_dict(self):
+        idx = self.idx
+        return {
+            'id': idx,
+            'name': f'stock {idx}',
+            'date': '01/01/2021',
+            'symbols_eur': [f'S{idx}.F'],
+            'symbols_usd': [f'S{idx}'],
+            'tags': ['Industrials', 'Machinery'],
+            'indices': ['DAX'],
+            'country': 'Germany',
+            'last_price_eur': {f'S{idx}.F': 1.0},
+            'last_price_usd': {f'S{idx}': 1.0},
+        }
+
+
+class Close:
+    __slots__ = ('close',)
+
+    def __init__(self, close):
+        self.close = close
+
+
+def signals(idx):
+    # a generated name per signal like the tag names pony loads
+    for pos, name in enumerate(FILTERS):
+        yield ''.join(list(name)), float(idx + pos), 1
+
+
+def previous(snapshots):
+    docs = [(doc.to_dict(), doc) for doc in snapshots]
+    for idx in range(len(snapshots)):
+        name = f'stock {idx}'
+        my_doc = None
+        for doc_dict, doc in docs:
+            if name == doc_dict['name']:
+                my_doc = doc
+                break
+        sigs = []
+        for sig_name, value, status in signals(idx):
+            signal = {'value': value, 'status': status, 'name': sig_name}
+            if not any(si['name'] == signal['name'] for si in sigs):
+                sigs.append(signal)
+        stock = {
+            'date': datetime.datetime.now().strftime('%m/%d/%Y'),
+            'last_price_usd': None,
+            'last_price_eur': None,
+        }
+        for signal in sigs:
+            stock['{}_value'.format(signal['name'])] = signal['value']
+            stock['{}_status'.format(signal['name'])] = signal['status']
+        my_doc_dict = my_doc.to_dict()
+        for price_key in (
+            ('last_price_eur', 'symbols_eur'),
+            ('last_price_usd', 'symbols_usd'),
+        ):
+            stock[price_key[0]] = {}
+            for sym in my_doc_dict[price_key[1]]:
+                stock[price_key[0]][sym] = Close(1.0)
+            for key, value in stock[price_key[0]].items():
+                stock[price_key[0]][key] = value.close
+        yield my_doc, stock
+
+
+def current(snapshots):
+    docs = {}
+    for doc in snapshots:
+        doc_dict = doc.to_dict()
+        docs[doc_dict['name']] = StockDoc.from_snapshot(doc, doc_dict)
+    payload = PayloadBuilder(lambda symbol: 1.0)
+    for idx in range(len(snapshots)):
+        name = f'stock {idx}'
+        my_doc = docs[name]
+        yield my_doc, payload.build(name, signals(idx), my_doc)
+
+
+def measure(func, snapshots):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    batch = []
+    for item in func(snapshots):
+        batch.append(item)
+        if len(batch) >= BATCH:
+            batch = []
+    duration = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().statistics('filename')
+    tracemalloc.stop()
+    return duration, peak, sum(stat.count for stat in stats)
+
+
+def main(count=10000):
+    snapshots = [Snapshot(idx) for idx in range(count)]
+    for name, func in (('previous', previous), ('current', current)):
+        duration, peak, blocks = measure(func, snapshots)
+        print(
+            f'{name:>8}: {duration:6.2f}s peak {peak / 2 ** 20:6.1f} MiB '
+            f'retained blocks {blocks} ({count} stocks)'
+        )
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -34,6 +34,7 @@ setup(
     long_description_content_type='text/markdown',
     url='https://github.com/SlashGordon/pyfirebasestockscli',
     install_requires=INSTALL_REQUIRES,
+    extras_require={'export': ['pyarrow']},
     packages=find_packages('src', exclude=EXCLUDE_FROM_PACKAGES),
     entry_points={'console_scripts': [
             'stocks = pyfirebasestockscli:app',
@@ -9,57 +9,135 @@
 """
 import argparse
 import datetime
-import itertools
 import json
 import logging
-import math
 import os
 import sys
 
-import firebase_admin
-from firebase_admin import credentials, firestore
-from pony.orm import db_session, desc, select
-from pystockdb.db.schema.stocks import Price, PriceItem, Stock, Tag, Type
+from pony.orm import db_session, desc, exists, select
+from pystockdb.db.schema.stocks import (
+    Index,
+    Price,
+    PriceItem,
+    Stock,
+    Symbol,
+    Tag,
+    Type,
+)
 from pystockdb.tools.create import CreateAndFillDataBase
+from pystockdb.tools.sync import SyncDataBaseStocks
 from pystockdb.tools.update import UpdateDataBaseStocks
 from pystockfilter.base.base_helper import BaseHelper
-from pystockfilter.tool.build_filters import BuildFilters
-from pystockfilter.tool.build_internal_filters import BuildInternalFilters
 from pytickersymbols import PyTickerSymbols
 
+from pyfirebasestockscli.backend import (
+    commit,
+    firestore_client,
+    get_client,
+    init_app,
+    shutdown,
+    use_client,
+)
 from pyfirebasestockscli.dividend_kings import DividendKings
+from pyfirebasestockscli.dividend_kings import dividend_symbols
+from pyfirebasestockscli.dividends import DividendYields, fetch_dividends
+from pyfirebasestockscli.dryrun import LatencyLog, RecordingClient
+from pyfirebasestockscli.dryrun import latency_path, save_latencies
+from pyfirebasestockscli.export import ColumnarExport
+from pyfirebasestockscli.live import LivePricePush
+from pyfirebasestockscli.memo import FilterCache, data_versions
+from pyfirebasestockscli.memo import newest_first, prune_signals
+from pyfirebasestockscli.memo import signal_name, signal_symbols
+from pyfirebasestockscli.parallel import ParallelFilterRunner
+from pyfirebasestockscli.parallel import internal_filter_names
+from pyfirebasestockscli.payload import PayloadBuilder, StockDoc, run_date
+from pyfirebasestockscli.prices import PriceStore
+from pyfirebasestockscli.profiling import StageProfiler
+from pyfirebasestockscli.reconcile import Reconciliation
+from pyfirebasestockscli.replay import Archive, Harness
+from pyfirebasestockscli.schedule import FundamentalsScheduler
+from pyfirebasestockscli.sharding import ShardMap, chunk_slices
+from pyfirebasestockscli.sharding import documents_by_name, existing_names
+from pyfirebasestockscli.sharding import stock_documents
+from pyfirebasestockscli.stages import StageGraph
+from pyfirebasestockscli.storage import (
+    bind_database,
+    bulk_load,
+    create_indexes,
+    default_db_path,
+    has_table,
+    register_profile,
+)
+from pyfirebasestockscli.universe import UniverseCache, package_version
+
+
+def node_config():
+    '''
+    Returns the id of this node and the number of nodes
+    '''
+    return (
+        int(os.environ.get('STOCK2FIREBASE_ID', 0)),
+        int(os.environ.get('STOCK2FIREBASE_MAX_PROCESSES', 1)),
+    )
 
 
-def create_job(indices, stock_data):
-    my_id = int(os.environ['STOCK2FIREBASE_ID'])
-    max_processes = int(os.environ['STOCK2FIREBASE_MAX_PROCESSES'])
-    index_symbols = []
-    stocks = []
-    for index in indices:
-        stocks = stocks + stock_data.get_yahoo_ticker_symbols_by_index(index)
-        # we also need index data for levermann filter
-        index_symbols.append(stock_data.index_to_yahoo_symbol(index))
+def load_universe(indices, stock_data, db_path=None, logger=None):
+    '''
+    Loads the universe from universe.json next to the local database
+    '''
+    db_root = os.path.dirname(os.path.abspath(db_path or default_db_path()))
+    cache_path = os.environ.get(
+        'STOCK2FIREBASE_UNIVERSE', os.path.join(db_root, 'universe.json')
+    )
+    return UniverseCache(cache_path, logger).load(indices, stock_data)
 
-    # removes duplicate values
-    stocks.sort()
-    stocks_clean = list(stocks for stocks, _ in itertools.groupby(stocks))
 
-    # create chunks
+def create_job(indices, stock_data, db_path=None, logger=None):
+    my_id, max_processes = node_config()
+    universe = load_universe(indices, stock_data, db_path, logger)
+    stocks_clean = universe['groups']
+    index_symbols = universe['index_symbols']
 
-    chunk_size = math.ceil((len(stocks_clean) / max_processes))
-    chunks = [
-        stocks_clean[x : x + chunk_size]
-        for x in range(0, len(stocks_clean), chunk_size)
-    ]
-    stocks = chunks[my_id]
+    # create chunks
+    chunk = chunk_slices(len(stocks_clean), max_processes)[my_id]
+    stocks = stocks_clean[chunk]
 
     fra_symbols = [
-        sym for syms in stocks for sym in syms if sym.endswith('.F')
+        sym for syms in universe['fra_groups'][chunk] for sym in syms
     ]
     all_symbols = [sym for syms in stocks for sym in syms]
     return all_symbols, fra_symbols, index_symbols
 
 
+def stock_fields(stock_item):
+    return {
+        'name': stock_item.name,
+        'symbols_usd': [
+            sym.name
+            for sym in stock_item.price_item.symbols
+            if Tag.YAO in sym.item.tags.name
+            and Tag.USD in sym.item.tags.name
+        ],
+        'symbols_eur': [
+            sym.name
+            for sym in stock_item.price_item.symbols
+            if Tag.YAO in sym.item.tags.name
+            and Tag.EUR in sym.item.tags.name
+        ],
+        'country': [
+            tag.name
+            for tag in stock_item.price_item.item.tags
+            if tag.type.name == Type.REG
+        ][0],
+        'tags': [
+            tag.name
+            for tag in stock_item.price_item.item.tags
+            if tag.type.name == Type.IND
+        ],
+        'indices': [index.name for index in stock_item.indexs],
+    }
+
+
 class BatchWriter(object):
     def __init__(self, max_writes, delete=False):
         self.delete = delete
@@ -69,7 +147,7 @@ class BatchWriter(object):
         def wrapped_f(*args, **kwargs):
             reference_name = args[1]
             items = args[2]
-            store = firestore.client()
+            store = get_client()
             batch = store.batch()
             ref = store.collection(reference_name)
             if self.delete:
@@ -81,10 +159,11 @@ class BatchWriter(object):
             args = list(args)
             for chunk in chunks:
                 args[2] = chunk
-                writes = f(*args, **kwargs)
-                for write in writes:
+                writes = 0
+                for write in f(*args, **kwargs):
                     batch.set(ref.document(), write)
-                batch.commit()
+                    writes += 1
+                commit(batch, writes)
 
         return wrapped_f
 
@@ -110,7 +189,7 @@ class BatchUpdate(object):
     def __call__(self, f):
         def wrapped_f(*args, **kwargs):
             items = args[2]
-            store = firestore.client()
+            store = get_client()
             batch = store.batch()
             chunks = [
                 items[x : x + self.max_updates]
@@ -119,10 +198,11 @@ class BatchUpdate(object):
             args = list(args)
             for chunk in chunks:
                 args[2] = chunk
-                updates = f(*args, **kwargs)
-                for my_doc, update in updates:
+                updates = 0
+                for my_doc, update in f(*args, **kwargs):
                     batch.set(my_doc.reference, update, merge=True)
-                batch.commit()
+                    updates += 1
+                commit(batch, updates)
 
         return wrapped_f
 
@@ -130,15 +210,19 @@ class BatchUpdate(object):
 batch_updater = BatchUpdate
 
 
+def delete_documents(references, max_deletes=400):
+    store = get_client()
+    for idx in range(0, len(references), max_deletes):
+        chunk = references[idx : idx + max_deletes]
+        batch = store.batch()
+        for reference in chunk:
+            batch.delete(reference)
+        commit(batch, len(chunk))
+
+
 class FirbaseBase:
     def __init__(self, *args, **kwargs):
-        options = {'databaseURL': kwargs['databaseURL']}
-        cred_json_path = kwargs['cred_json']
-        cred = credentials.Certificate(cred_json_path)
-        try:
-            firebase_admin.get_app()
-        except ValueError:
-            firebase_admin.initialize_app(cred, options=options)
+        init_app(kwargs['databaseURL'], kwargs['cred_json'])
         self.logger = kwargs['logger']
 
 
@@ -148,7 +232,7 @@ class CreateTagFile(FirbaseBase):
         self.output_file = kwargs['output_file']
 
     def build(self):
-        store = firestore.client()
+        store = get_client()
         tag_docs = store.collection('tags').stream()
         stock_docs = store.collection('stocks').stream()
         data = {'stocks': []}
@@ -197,125 +281,133 @@ class AddStrategiesFirebaseDB(FirbaseBase):
 class FindMissingStocks(FirbaseBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-
-    @staticmethod
-    def _is_stock_missing(stock_db, stock_docs):
-        for doc_dict, _ in stock_docs:
-            if stock_db.name == doc_dict['name']:
-                return False
-        return True
+        self.shard = kwargs.get('shard', None)
 
     @db_session
     def build(self, symbols):
-        store = firestore.client()
-        stock_docs = store.collection('stocks').stream()
-        stock_docs = [(doc.to_dict(), doc) for doc in stock_docs]
+        store = get_client()
+        stock_docs = stock_documents(store, self.shard)
         stocks = select(
             p.stock
             for p in PriceItem
             for sym in p.symbols
             if sym.name in symbols
         )
-        missing_stocks = list(
-            map(
-                lambda s: s.name,
-                filter(
-                    lambda x: self._is_stock_missing(x, stock_docs), stocks
-                ),
-            )
+        local_docs = {stock.name: stock_fields(stock) for stock in stocks}
+        # stocks which left all indices are removed
+        local_names = set(
+            select(stock.name for stock in Stock if exists(stock.indexs))
         )
-        return missing_stocks
+        reconciliation = Reconciliation.compute(
+            local_docs, stock_docs, local_names
+        )
+        if self.shard is not None and reconciliation.added:
+            # documents of another shard after the number of nodes changed
+            moved = existing_names(store, reconciliation.added)
+            if moved:
+                self.logger.warning(
+                    f'{len(moved)} stocks are in another shard, '
+                    'run stocks --rebalance.'
+                )
+                reconciliation.added = [
+                    name for name in reconciliation.added if name not in moved
+                ]
+        return reconciliation
 
 
 class SyncFirebaseDB(FirbaseBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.export_root = kwargs.get('export_root', None)
+        self.export_format = kwargs.get('export_format', 'parquet')
+        self.exporter = None
+        self.price_store = kwargs.get('price_store', None)
+        self.shard = kwargs.get('shard', None)
+        self.payload = None
+
+    def __warn_price(self, symbol, name):
+        self.logger.warning(f'Prices are not correct for {symbol}({name}).')
+
+    def __last_price(self, symbol):
+        if self.price_store is not None:
+            return self.price_store.latest(symbol)
+        price = (
+            Price.select(lambda p: p.symbol.name == symbol)
+            .order_by(lambda p: desc(p.date))
+            .first()
+        )
+        return price.close if price else None
+
+    @staticmethod
+    def __add_docs(stock_docs, snapshots):
+        for doc in snapshots:
+            doc_dict = doc.to_dict()
+            if doc_dict['name'] not in stock_docs:
+                stock_docs[doc_dict['name']] = StockDoc.from_snapshot(
+                    doc, doc_dict
+                )
 
     @db_session
     def build(self, symbols):
-        store = firestore.client()
-        stock_docs = store.collection('stocks').stream()
-        stock_docs = [(doc.to_dict(), doc) for doc in stock_docs]
+        store = get_client()
+        stock_docs = {}
+        self.__add_docs(stock_docs, stock_documents(store, self.shard))
         stocks = select(
             p.stock
             for p in PriceItem
             for sym in p.symbols
             if sym.name in symbols
         )
+        moved = {stock.name for stock in stocks} - set(stock_docs)
+        if self.shard is not None and moved:
+            # documents of another shard after a node count change
+            moved_docs = documents_by_name(store, sorted(moved))
+            self.__add_docs(stock_docs, moved_docs)
+            self.logger.warning(
+                f'{len(moved)} stocks are in another shard, '
+                'run stocks --rebalance.'
+            )
+        if self.export_root:
+            self.exporter = ColumnarExport(
+                self.export_root,
+                self.export_format,
+                shard=os.environ.get('STOCK2FIREBASE_ID', 0),
+                logger=self.logger,
+            )
+        self.payload = PayloadBuilder(self.__last_price, self.__warn_price)
         # add missing stocks
         self.__update(stock_docs, stocks)
+        if self.exporter:
+            path = self.exporter.close()
+            self.logger.info(f'Exported sync payloads to {path}')
+            self.exporter = None
+
+    @staticmethod
+    def _signals(stock_item):
+        # the payload keeps the first signal of a filter
+        for signal_item in newest_first(stock_item.price_item.signals):
+            yield (
+                signal_name(signal_item),
+                signal_item.result.value,
+                signal_item.result.status,
+            )
 
     @batch_updater(400)
     def __update(self, docs, stocks):
         for stock_item in stocks:
             # find coresbondanding document
-            my_doc = None
-            for doc_dict, doc in docs:
-                if stock_item.name == doc_dict['name']:
-                    my_doc = doc
-                    break
+            my_doc = docs.get(stock_item.name)
 
             if not my_doc:
                 raise RuntimeError(
                     f"Stock {stock_item.name} doesn't exist in firestore."
                 )
 
-            signals = []
-            for signal_item in stock_item.price_item.signals:
-                signal = {
-                    'value': signal_item.result.value,
-                    'status': signal_item.result.status,
-                    'name': [tag.name for tag in signal_item.item.tags][0],
-                }
-
-                def is_in(signals, signal):
-                    for si in signals:
-                        if si['name'] == signal['name']:
-                            return True
-                    return False
-
-                if not is_in(signals, signal):
-                    signals.append(signal)
-
-            stock = {
-                'date': datetime.datetime.now().strftime('%m/%d/%Y'),
-                'last_price_usd': None,
-                'last_price_eur': None,
-            }
-            # add signals to document in a flat way to simplify queries
-            for signal_item in signals:
-                stock['{}_value'.format(signal_item['name'])] = signal_item[
-                    'value'
-                ]
-                stock['{}_status'.format(signal_item['name'])] = signal_item[
-                    'status'
-                ]
-
-            my_doc_dict = my_doc.to_dict()
-
-            for price_key in (
-                ('last_price_eur', 'symbols_eur'),
-                ('last_price_usd', 'symbols_usd'),
-            ):
-                stock[price_key[0]] = {}
-                # get prices for each symbol
-                for usd_symbol in my_doc_dict[price_key[1]]:
-                    stock[price_key[0]][usd_symbol] = (
-                        Price.select(lambda p: p.symbol.name == usd_symbol)
-                        .order_by(lambda p: desc(p.date))
-                        .first()
-                    )
-                # set latest price for each symbol
-                for key, value in stock[price_key[0]].items():
-                    if value is None:
-                        self.logger.warning(
-                            f'Prices are not correct for {key}'
-                            f'({stock_item.name}).'
-                        )
-                    else:
-                        stock[price_key[0]][key] = stock[price_key[0]][
-                            key
-                        ].close
+            stock = self.payload.build(
+                stock_item.name, self._signals(stock_item), my_doc
+            )
+            if self.exporter:
+                self.exporter.add(stock_item.name, stock)
             yield my_doc, stock
 
 
@@ -325,9 +417,11 @@ class CreateFirebaseDB(FirbaseBase):
         super().__init__(*args, **kwargs)
         self.stock_data = kwargs['stock_data']
         self.stock_names_missing = kwargs.get('stocks_missing', None)
+        self.shard_map = kwargs.get('shard_map', None)
 
     @db_session
     def build(self):
+        self.run_date = run_date()
         stocks = list(select(i for i in Stock))
         if self.stock_names_missing is not None:
             stocks = list(
@@ -356,36 +450,13 @@ class CreateFirebaseDB(FirbaseBase):
     @batch_writer(400, delete=True)
     def __write(self, ref, items):
         for idx, stock_item in enumerate(items):
-            stock = {
-                'id': idx,
-                'name': stock_item.name,
-                'date': datetime.datetime.now().strftime('%m/%d/%Y'),
-                'symbols_usd': [
-                    sym.name
-                    for sym in stock_item.price_item.symbols
-                    if Tag.YAO in sym.item.tags.name
-                    and Tag.USD in sym.item.tags.name
-                ],
-                'symbols_eur': [
-                    sym.name
-                    for sym in stock_item.price_item.symbols
-                    if Tag.YAO in sym.item.tags.name
-                    and Tag.EUR in sym.item.tags.name
-                ],
-                'country': [
-                    tag.name
-                    for tag in stock_item.price_item.item.tags
-                    if tag.type.name == Type.REG
-                ][0],
-                'tags': [
-                    tag.name
-                    for tag in stock_item.price_item.item.tags
-                    if tag.type.name == Type.IND
-                ],
-                'indices': [index.name for index in stock_item.indexs],
-                'last_price_usd': None,
-                'last_price_eur': None,
-            }
+            stock = stock_fields(stock_item)
+            stock['id'] = idx
+            stock['date'] = self.run_date
+            stock['last_price_usd'] = None
+            stock['last_price_eur'] = None
+            if self.shard_map:
+                stock['shard'] = self.shard_map.shard_of(stock)
             yield stock
 
 class CreateFirebaseDBWithoutWipe(FirbaseBase):
@@ -393,17 +464,28 @@ class CreateFirebaseDBWithoutWipe(FirbaseBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.stock_data = kwargs['stock_data']
-        self.stock_names_missing = kwargs.get('stocks_missing', None)
+        self.shard_map = kwargs.get('shard_map', None)
+        self.reconciliation = kwargs.get('reconciliation', None)
+        if self.reconciliation is None:
+            self.reconciliation = Reconciliation(
+                added=kwargs.get('stocks_missing', None) or []
+            )
 
     @db_session
     def build(self):
-        stocks = list(select(i for i in Stock))
-        if self.stock_names_missing is not None:
+        self.run_date = run_date()
+        reconciliation = self.reconciliation
+        if reconciliation.added:
             stocks = list(
-                filter(lambda x: x.name in self.stock_names_missing, stocks)
+                select(i for i in Stock if i.name in reconciliation.added)
+            )
+            self.__write('stocks', stocks)
+        if reconciliation.changed:
+            self.__update('stocks', reconciliation.changed)
+        if reconciliation.removed:
+            delete_documents(
+                [snapshot.reference for snapshot in reconciliation.removed]
             )
-
-        self.__write('stocks', stocks)
         tags = [
             {
                 'type': 'countries',
@@ -425,38 +507,390 @@ class CreateFirebaseDBWithoutWipe(FirbaseBase):
     @batch_writer(400, delete=False)
     def __write(self, ref, items):
         for idx, stock_item in enumerate(items):
-            stock = {
-                'id': idx,
-                'name': stock_item.name,
-                'date': datetime.datetime.now().strftime('%m/%d/%Y'),
-                'symbols_usd': [
-                    sym.name
-                    for sym in stock_item.price_item.symbols
-                    if Tag.YAO in sym.item.tags.name
-                    and Tag.USD in sym.item.tags.name
-                ],
-                'symbols_eur': [
-                    sym.name
-                    for sym in stock_item.price_item.symbols
-                    if Tag.YAO in sym.item.tags.name
-                    and Tag.EUR in sym.item.tags.name
-                ],
-                'country': [
-                    tag.name
-                    for tag in stock_item.price_item.item.tags
-                    if tag.type.name == Type.REG
-                ][0],
-                'tags': [
-                    tag.name
-                    for tag in stock_item.price_item.item.tags
-                    if tag.type.name == Type.IND
-                ],
-                'indices': [index.name for index in stock_item.indexs],
-                'last_price_usd': None,
-                'last_price_eur': None,
-            }
+            stock = stock_fields(stock_item)
+            stock['id'] = idx
+            stock['date'] = self.run_date
+            stock['last_price_usd'] = None
+            stock['last_price_eur'] = None
+            if self.shard_map:
+                stock['shard'] = self.shard_map.shard_of(stock)
             yield stock
 
+    @batch_updater(400)
+    def __update(self, ref, items):
+        for name, snapshot in items:
+            stock = stock_fields(Stock.get(name=name))
+            stock['date'] = self.run_date
+            yield snapshot, stock
+
+
+class RebalanceShards(FirbaseBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_map = kwargs['shard_map']
+
+    def build(self):
+        store = get_client()
+        moves = self.shard_map.moves(stock_documents(store))
+        self.logger.info(f'Move {len(moves)} stock documents')
+        if moves:
+            self.__update('stocks', moves)
+        return len(moves)
+
+    @batch_updater(400)
+    def __update(self, ref, items):
+        for snapshot, update in items:
+            yield snapshot, update
+
+
+class SyncIndexStocks(SyncDataBaseStocks):
+    '''
+    Adds new indices and updates the stocks of all indices of the local
+    database. Stocks which left an index are only unlinked and keep their
+    prices and fundamentals.
+    '''
+
+    def __init__(self, arguments, logger):
+        super().__init__(arguments, logger)
+        self.all_indices = list(self.indices_list)
+
+    def build(self):
+        super().build()
+        return self.sync_members()
+
+    @db_session
+    def sync_members(self):
+        added = removed = 0
+        for index in Index.select(lambda i: i.name in self.all_indices):
+            wanted = {
+                info['name']: info
+                for info in self.ticker_symbols.get_stocks_by_index(index.name)
+            }
+            current = {stock.name: stock for stock in index.stocks}
+            for name in sorted(wanted.keys() - current.keys()):
+                # creates the stock or links an existing one
+                self._DBBase__add_stock_to_index(index, wanted[name])
+                added += 1
+            for name in sorted(current.keys() - wanted.keys()):
+                index.stocks.remove(current[name])
+                removed += 1
+        self.logger.info(
+            f'Index members: {added} stocks added, {removed} removed'
+        )
+        return added, removed
+
+
+def _shard_map(ctx):
+    universe = load_universe(
+        ctx['indices'], ctx['stock_data'], ctx['db_path'], ctx['logger']
+    )
+    return ShardMap(universe['groups'], node_config()[1])
+
+
+def _shard_config(ctx):
+    if not ctx['args'].sharded:
+        return ctx['firbase_config']
+    return dict(ctx['firbase_config'], shard=node_config()[0])
+
+
+def _stage_tags(ctx):
+    config = dict(ctx['firbase_config'], output_file='tags.json')
+    CreateTagFile(**config).build()
+
+
+def _stage_strategies(ctx):
+    AddStrategiesFirebaseDB(**ctx['firbase_config']).build()
+
+
+def _stage_database(ctx):
+    db_path = ctx['db_path']
+    config_build = ctx['config_build']
+    if ctx['args'].create or not has_table(db_path, 'Stock'):
+        CreateAndFillDataBase(config_build, ctx['logger']).build()
+        # the new database has no prices, fundamentals and signals
+        _scheduler(ctx).reset()
+        FilterCache(db_path).clear()
+        ctx['price_store'].clear()
+    else:
+        # syncs the indices and keeps prices, fundamentals and signals
+        config_sync = dict(
+            config_build, create=False, db_args=dict(config_build['db_args'])
+        )
+        SyncIndexStocks(config_sync, ctx['logger']).build()
+    create_indexes(db_path)
+    return {'database': True}
+
+
+def _stage_create(ctx):
+    ctx['logger'].info('Delete old data and add new')
+    config = dict(ctx['firbase_config'], shard_map=_shard_map(ctx))
+    CreateFirebaseDB(**config).build()
+    return {'documents': True}
+
+
+def _stage_job(ctx):
+    all_symbols, fra_symbols, index_symbols = create_job(
+        ctx['indices'],
+        ctx['stock_data'],
+        db_path=ctx['db_path'],
+        logger=ctx['logger'],
+    )
+    return {
+        'all_symbols': all_symbols,
+        'fra_symbols': fra_symbols,
+        'index_symbols': index_symbols,
+    }
+
+
+def _stage_prices(ctx):
+    db_path = ctx['db_path']
+    config_update_prices = {
+        'symbols': ctx['index_symbols'] + ctx['all_symbols'],
+        'prices': True,
+        'fundamentals': False,
+        'db_args': {'provider': 'sqlite', 'filename': db_path},
+    }
+    update = UpdateDataBaseStocks(config_update_prices, ctx['logger'])
+    missing = ctx['price_store'].missing(config_update_prices['symbols'])
+    if ctx['args'].bulk_load:
+        with bulk_load(db_path):
+            update.build()
+    else:
+        update.build()
+    if len(missing) < len(config_update_prices['symbols']):
+        # pystockdb only downloads the history if there are no prices
+        _download_history(update, missing, ctx['config_build']['max_history'])
+    ctx['logger'].info('Update price arrays')
+    ctx['price_store'].refresh(config_update_prices['symbols'])
+    return {'prices': True}
+
+
+@db_session
+def _download_history(update, symbols, max_history):
+    symbols = [Symbol.get(name=symbol) for symbol in symbols]
+    symbols = [symbol for symbol in symbols if symbol is not None]
+    if not symbols:
+        return
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(days=365 * max_history)
+    update.download_historicals(
+        symbols,
+        start=start.strftime('%Y-%m-%d'),
+        end=end.strftime('%Y-%m-%d'),
+    )
+
+
+def _scheduler(ctx):
+    return FundamentalsScheduler(
+        ctx['db_path'],
+        max_age=ctx['args'].fundamentals_max_age,
+        spread_days=ctx['args'].fundamentals_spread,
+    )
+
+
+def _stage_fundamentals(ctx):
+    logger = ctx['logger']
+    fra_symbols = ctx['fra_symbols']
+    scheduler = _scheduler(ctx)
+    if ctx['args'].fundamentals_all:
+        stale_symbols = fra_symbols
+    else:
+        stale_symbols = scheduler.select(fra_symbols)
+    logger.info(
+        f'Refresh fundamentals of {len(stale_symbols)} of '
+        f'{len(fra_symbols)} symbols'
+    )
+    if stale_symbols:
+        config_update_fundamentals = {
+            'symbols': stale_symbols,
+            'prices': False,
+            'fundamentals': True,
+            'db_args': {'provider': 'sqlite', 'filename': ctx['db_path']},
+        }
+        update = UpdateDataBaseStocks(config_update_fundamentals, logger)
+        update.build()
+        scheduler.mark(stale_symbols)
+    return {'fundamentals': True}
+
+
+def _stage_dividends(ctx):
+    logger = ctx['logger']
+    symbols = dividend_symbols(ctx['fra_symbols'])
+    logger.info(f'Update dividend yields of {len(symbols)} symbols')
+    dividends = fetch_dividends(
+        symbols, workers=ctx['args'].filter_workers, logger=logger
+    )
+    table = DividendYields(ctx['db_path'], ctx['price_store'], logger=logger)
+    table.refresh(dividends)
+    return {'dividends': True}
+
+
+def _stage_filters(ctx):
+    args = ctx['args']
+    logger = ctx['logger']
+    db_path = ctx['db_path']
+    fra_symbols = ctx['fra_symbols']
+    arguments_div = {
+        'name': 'DividendKings',
+        'price_root': ctx['price_root'],
+        'yield_db': db_path,
+        'bars': False,
+        'index_bars': False,
+        'args': {
+            'threshold_buy': 3,
+            'threshold_sell': 0.2,
+            'intervals': None,
+            'max_div_yield': 9,
+            'lookback': 2,
+        },
+    }
+
+    internal_args = {'pystockfilter': package_version('pystockfilter')}
+    versions = data_versions(
+        fra_symbols, _scheduler(ctx).last_refresh(fra_symbols)
+    )
+    filter_cache = FilterCache(db_path, ttl=args.filter_cache_ttl, logger=logger)
+    if args.no_filter_cache:
+        internal_symbols = fra_symbols
+        custom_symbols = fra_symbols
+    else:
+        internal_symbols = filter_cache.stale(
+            'BuildInternalFilters', internal_args, versions
+        )
+        custom_symbols = filter_cache.stale(
+            DividendKings.NAME, arguments_div, versions
+        )
+        filter_cache.log_stats()
+
+    runner = ParallelFilterRunner(
+        {'provider': 'sqlite', 'filename': db_path},
+        workers=args.filter_workers,
+        logger=logger,
+    )
+    # only symbols with new signals of all filters are cached
+    start = datetime.datetime.now()
+    if internal_symbols:
+        logger.info('Build Filters')
+        runner.run_internal(internal_symbols)
+        filter_cache.store(
+            'BuildInternalFilters',
+            internal_args,
+            versions,
+            signal_symbols(internal_symbols, internal_filter_names(), start),
+        )
+    if custom_symbols:
+        logger.info('Create custom Filters')
+        runner.run_custom(custom_symbols, arguments_div)
+        filter_cache.store(
+            DividendKings.NAME,
+            arguments_div,
+            versions,
+            signal_symbols(custom_symbols, [DividendKings.NAME], start),
+        )
+    pruned = prune_signals(sorted(set(internal_symbols) | set(custom_symbols)))
+    logger.info(f'Deleted {pruned} replaced signals')
+    return {'signals': True}
+
+
+def _stage_missing(ctx):
+    logger = ctx['logger']
+    find_missing = FindMissingStocks(**_shard_config(ctx))
+    reconciliation = find_missing.build(ctx['fra_symbols'])
+    if reconciliation:
+        logger.info(f'Reconcile stocks: {reconciliation}')
+        add_missing = dict(ctx['firbase_config'], shard_map=_shard_map(ctx))
+        add_missing['reconciliation'] = reconciliation
+        create_fb = CreateFirebaseDBWithoutWipe(**add_missing)
+        create_fb.build()
+    return {'documents': True}
+
+
+def _stage_sync(ctx):
+    sync = SyncFirebaseDB(**_shard_config(ctx))
+    sync.build(ctx['fra_symbols'])
+
+
+def _stage_rebalance(ctx):
+    config = dict(ctx['firbase_config'], shard_map=_shard_map(ctx))
+    RebalanceShards(**config).build()
+
+
+def build_stage_graph(logger, profiler=None):
+    graph = StageGraph(logger, profiler)
+    graph.add('tags', _stage_tags)
+    graph.add('strategies', _stage_strategies)
+    graph.add('rebalance', _stage_rebalance)
+    graph.add('database', _stage_database, outputs=['database'])
+    graph.add(
+        'create', _stage_create, inputs=['database'], outputs=['documents']
+    )
+    graph.add(
+        'job',
+        _stage_job,
+        outputs=['all_symbols', 'fra_symbols', 'index_symbols'],
+        cheap=True,
+    )
+    graph.add(
+        'prices',
+        _stage_prices,
+        inputs=['database', 'all_symbols', 'index_symbols'],
+        outputs=['prices'],
+    )
+    graph.add(
+        'fundamentals',
+        _stage_fundamentals,
+        inputs=['database', 'fra_symbols'],
+        outputs=['fundamentals'],
+    )
+    graph.add(
+        'dividends',
+        _stage_dividends,
+        inputs=['prices', 'fra_symbols'],
+        outputs=['dividends'],
+    )
+    graph.add(
+        'filters',
+        _stage_filters,
+        inputs=['prices', 'fundamentals', 'dividends', 'fra_symbols'],
+        outputs=['signals'],
+    )
+    graph.add(
+        'missing',
+        _stage_missing,
+        inputs=['database', 'fra_symbols'],
+        outputs=['documents'],
+    )
+    graph.add(
+        'sync',
+        _stage_sync,
+        inputs=['prices', 'signals', 'documents', 'fra_symbols'],
+    )
+    return graph
+
+
+# stages of each command line flag, the last entry is the full update
+STAGE_FLAGS = (
+    ('tags', ('tags',)),
+    ('strategies', ('strategies',)),
+    ('rebalance', ('rebalance',)),
+    ('create', ('database', 'create')),
+    ('updateprices', ('database', 'job', 'prices', 'missing', 'sync')),
+    (
+        'update',
+        (
+            'database',
+            'job',
+            'prices',
+            'fundamentals',
+            'dividends',
+            'filters',
+            'missing',
+            'sync',
+        ),
+    ),
+)
+
+
 def app(args=sys.argv[1:]):
     '''
     Main entry point for application
@@ -492,6 +926,18 @@ def app(args=sys.argv[1:]):
         help='Create all strategies.',
         default=False,
     )
+    parser.add_argument(
+        '--rebalance',
+        action='store_true',
+        help='Assign the stock documents to the shards of the current nodes.',
+        default=False,
+    )
+    parser.add_argument(
+        '--sharded',
+        action='store_true',
+        help='Read only the stock documents of this node.',
+        default=False,
+    )
     parser.add_argument(
         '-t',
         '--tags',
@@ -499,14 +945,156 @@ def app(args=sys.argv[1:]):
         help='Create json tag file.',
         default=False,
     )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Push new prices of the local database continuously.',
+        default=False,
+    )
+    parser.add_argument(
+        '--daemon-window',
+        type=float,
+        help='Seconds to collect price changes before pushing them.',
+        default=30,
+    )
+    parser.add_argument(
+        '--daemon-interval',
+        type=float,
+        help='Seconds between two polls of the price table.',
+        default=5,
+    )
+    parser.add_argument(
+        '--only',
+        help='Run only these comma separated stages.',
+        default=None,
+    )
+    parser.add_argument(
+        '--from',
+        dest='start',
+        help='Run the selected stages starting with this stage.',
+        default=None,
+    )
+    parser.add_argument(
+        '--stage-workers',
+        type=int,
+        help='Run independent stages in this number of threads.',
+        default=1,
+    )
+    parser.add_argument(
+        '--list-stages',
+        action='store_true',
+        help='List all stages.',
+        default=False,
+    )
+    parser.add_argument(
+        '--profile',
+        help='Write per stage profiles and sql statistics to this directory.',
+        default=None,
+    )
+    parser.add_argument(
+        '--profile-mode',
+        choices=StageProfiler.MODES,
+        help='Sampling profiler (collapsed stacks) or cProfile.',
+        default='sample',
+    )
+    parser.add_argument(
+        '--db',
+        help='Path of the local sqlite database.',
+        default=None,
+    )
+    parser.add_argument(
+        '--bulk-load',
+        action='store_true',
+        help='Rebuild the price indexes after the price update.',
+        default=False,
+    )
+    parser.add_argument(
+        '--fundamentals-max-age',
+        type=int,
+        help='Refresh fundamentals older than this number of days.',
+        default=90,
+    )
+    parser.add_argument(
+        '--fundamentals-spread',
+        type=int,
+        help='Spread fundamentals refreshes over this number of days.',
+        default=14,
+    )
+    parser.add_argument(
+        '--fundamentals-all',
+        action='store_true',
+        help='Refresh fundamentals of all symbols.',
+        default=False,
+    )
+    parser.add_argument(
+        '--filter-cache-ttl',
+        type=int,
+        help='Days until cached filter results expire.',
+        default=7,
+    )
+    parser.add_argument(
+        '--no-filter-cache',
+        action='store_true',
+        help='Run all filters even if their input data did not change.',
+        default=False,
+    )
+    parser.add_argument(
+        '--filter-workers',
+        type=int,
+        help='Number of processes/threads used to build the filters.',
+        default=1,
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Record all firestore writes and print the write plan.',
+        default=False,
+    )
+    parser.add_argument(
+        '--dry-run-diff',
+        action='store_true',
+        help='Compare the recorded writes with the current documents.',
+        default=False,
+    )
+    parser.add_argument(
+        '--record',
+        help='Record yfinance and firestore responses to this archive.',
+        default=None,
+    )
+    parser.add_argument(
+        '--replay',
+        help='Serve yfinance and firestore responses from this archive.',
+        default=None,
+    )
+    parser.add_argument(
+        '--export',
+        help='Export synced stocks as columnar file to this directory.',
+        default=None,
+    )
+    parser.add_argument(
+        '--export-format',
+        choices=['parquet', 'arrow'],
+        help='File format of the columnar export.',
+        default='parquet',
+    )
 
     args = parser.parse_args(args)
 
     logger = BaseHelper.setup_logger('firebase')
     logger.setLevel(logging.WARNING)
 
-    root_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(root_dir, 'full.sqlite')
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(args.profile, args.profile_mode)
+    graph = build_stage_graph(logger, profiler)
+    if args.list_stages:
+        print('\n'.join(graph.names))
+        return 0
+
+    db_path = args.db or default_db_path()
+    # the price arrays are written by the first price refresh
+    price_root = os.path.join(os.path.dirname(db_path), 'prices')
+    price_store = PriceStore(price_root, db_path)
 
     # get all possible indices
     stock_data = PyTickerSymbols()
@@ -524,100 +1112,87 @@ def app(args=sys.argv[1:]):
             'create_db': True,
         },
     }
-
     firbase_config = {
         'databaseURL': os.environ['DATABASE_URL'],
         'cred_json': os.environ['CRED_JSON'],
         'data_root': os.environ['DATA_ROOT'],
         'stock_data': stock_data,
         'logger': logger,
+        'export_root': args.export,
+        'export_format': args.export_format,
+        'price_store': price_store,
     }
 
-    if args.tags:
-        logger.info('Create tag file')
-        firbase_config['output_file'] = 'tags.json'
-        tags = CreateTagFile(**firbase_config)
-        tags.build()
-
-    if args.strategies:
-        logger.info('Create strategies')
-        strategies = AddStrategiesFirebaseDB(**firbase_config)
-        strategies.build()
-
-    if args.create:
-        logger.info('Create database')
-        create = CreateAndFillDataBase(config_build, logger)
-        create.build()
-        logger.info('Delete old data and add new')
-        create_fb = CreateFirebaseDB(**firbase_config)
-        create_fb.build()
-
-    if args.update or args.updateprices:
-        create = CreateAndFillDataBase(config_build, logger)
-        create.build()
-        all_symbols, fra_symbols, index_symbols = create_job(
-            indices, stock_data
+    harness = None
+    if args.record or args.replay:
+        mode = 'record' if args.record else 'replay'
+        harness = Harness(Archive(args.record or args.replay, mode))
+        harness.install()
+
+    recorder = None
+    if args.dry_run:
+        client_factory = firestore_client
+        if harness:
+            client = harness.client
+            client_factory = lambda: client  # noqa: E731
+        recorder = RecordingClient(client_factory, diff=args.dry_run_diff)
+        use_client(recorder)
+
+    context = {
+        'args': args,
+        'logger': logger,
+        'db_path': db_path,
+        'price_root': price_root,
+        'price_store': price_store,
+        'stock_data': stock_data,
+        'indices': indices,
+        'config_build': config_build,
+        'firbase_config': firbase_config,
+    }
+    if args.daemon:
+        FirbaseBase(**firbase_config)
+        live = LivePricePush(
+            db_path,
+            logger,
+            window=args.daemon_window,
+            interval=args.daemon_interval,
         )
-        logger.info('Update database prices')
-        config_update_prices = {
-            'symbols': index_symbols + all_symbols,
-            'prices': True,
-            'fundamentals': False,
-            'db_args': {'provider': 'sqlite', 'filename': db_path},
-        }
-        update = UpdateDataBaseStocks(config_update_prices, logger)
-        update.build()
-
-    if args.update:
-        logger.info('Update database fundamentals')
-        config_update_fundamentals = {
-            'symbols': fra_symbols,
-            'prices': False,
-            'fundamentals': True,
-            'db_args': {'provider': 'sqlite', 'filename': db_path},
-        }
-        update = UpdateDataBaseStocks(config_update_fundamentals, logger)
-        update.build()
-
-        arguments_div = {
-            'name': 'DividendKings',
-            'bars': False,
-            'index_bars': False,
-            'args': {
-                'threshold_buy': 3,
-                'threshold_sell': 0.2,
-                'intervals': None,
-                'max_div_yield': 9,
-                'lookback': 2,
-            },
-        }
-
-        config_filter = {'symbols': fra_symbols}
-
-        config_custom_filter = {
-            'symbols': config_filter['symbols'],
-            'filters': [DividendKings(arguments_div, logger)],
-        }
-
-        logger.info('Build Filters')
-        builder = BuildInternalFilters(config_filter, logger)
-        builder.build()
-        logger.info('Create custom Filters')
-        custom = BuildFilters(config_custom_filter, logger)
-        custom.build()
-
-    if args.update or args.updateprices:
-        logger.info('Find missing stocks')
-        find_missing = FindMissingStocks(**firbase_config)
-        missing_stocks = find_missing.build(fra_symbols)
-        if missing_stocks:
-            logger.info('Add missing stocks')
-            add_missing = firbase_config
-            add_missing['delete_existing'] = False
-            add_missing['stocks_missing'] = missing_stocks
-            create_fb = CreateFirebaseDBWithoutWipe(**add_missing)
-            create_fb.build()
-        logger.info('Sync with firestore')
-        sync = SyncFirebaseDB(**firbase_config)
-        sync.build(fra_symbols)
+        try:
+            live.run()
+        finally:
+            shutdown()
+        return 0
+
+    names = []
+    for flag, flag_stages in STAGE_FLAGS:
+        if getattr(args, flag):
+            names += [name for name in flag_stages if name not in names]
+    if args.only or args.start:
+        names = names or list(STAGE_FLAGS[-1][1])
+    only = args.only.split(',') if args.only else None
+    stages = graph.select(names, only, args.start)
+    if any(graph.requires(stage, 'database') for stage in stages):
+        # partial reruns skip the database stage
+        register_profile()
+        bind_database(config_build['db_args'])
+    try:
+        graph.run(
+            context,
+            names,
+            only=only,
+            start=args.start,
+            workers=args.stage_workers,
+        )
+    finally:
+        if harness:
+            harness.uninstall(graph.timings)
+
+    if args.replay:
+        print(json.dumps(harness.archive.compare(graph.timings), indent=2))
+    if recorder:
+        use_client(None)
+        plan = recorder.plan.summary(LatencyLog(latency_path(db_path)))
+        print(json.dumps(plan, indent=2))
+    elif not args.replay:
+        save_latencies(db_path)
     return 0
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import atexit
+import threading
+import time
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+_client = None
+_store = None
+_lock = threading.RLock()
+_credentials = {}
+_atexit = False
+
+# replayed runs never initialize firebase
+offline = False
+
+# (writes, seconds) of each batch commit in this process
+commit_latencies = []
+
+
+def init_app(database_url, cred_json):
+    """
+    Initializes the firebase app once per process, credentials are read
+    once per file
+    """
+    global _atexit
+    if offline:
+        return None
+    with _lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            pass
+        if cred_json not in _credentials:
+            _credentials[cred_json] = credentials.Certificate(cred_json)
+        app = firebase_admin.initialize_app(
+            _credentials[cred_json], options={'databaseURL': database_url}
+        )
+        if not _atexit:
+            atexit.register(shutdown)
+            _atexit = True
+        return app
+
+
+def use_client(client):
+    """
+    Replaces firestore.client() with client, None restores firestore
+    """
+    global _client
+    _client = client
+
+
+def firestore_client():
+    """
+    Returns the shared firestore client of this process
+    """
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = firestore.client()
+    return _store
+
+
+def get_client():
+    if _client is not None:
+        return _client
+    return firestore_client()
+
+
+def shutdown():
+    """
+    Closes the firestore client and deletes the firebase app
+    """
+    global _store
+    with _lock:
+        store, _store = _store, None
+        if store is not None and hasattr(store, 'close'):
+            store.close()
+        try:
+            firebase_admin.delete_app(firebase_admin.get_app())
+        except ValueError:
+            pass
+
+
+def commit(batch, writes):
+    start = time.perf_counter()
+    batch.commit()
+    commit_latencies.append((writes, time.perf_counter() - start))
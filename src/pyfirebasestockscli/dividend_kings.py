@@ -16,9 +16,29 @@ import tulipy as ti
 import yfinance as yf
 from dateutil.relativedelta import relativedelta
 from pony.orm import db_session, select
-from pystockdb.db.schema.stocks import Price, Tag
+from pystockdb.db.schema.stocks import Price, PriceItem, Tag
 from pystockfilter.filter.base_filter import BaseFilter
 
+from pyfirebasestockscli.dividends import DividendYields
+from pyfirebasestockscli.prices import PriceStore
+
+
+def yahoo_symbol(stock):
+    return select(sym.name for sym in stock.price_item.symbols
+                  if Tag.YAO in sym.item.tags.name).first()
+
+
+@db_session
+def dividend_symbols(symbols):
+    '''
+    Returns the symbols whose dividends DividendKings uses for the stocks
+    of symbols
+    '''
+    stocks = select(
+        p.stock for p in PriceItem for sym in p.symbols if sym.name in symbols
+    )
+    return sorted({yahoo_symbol(stock) for stock in stocks} - {None})
+
 
 class DividendKings(BaseFilter):
     """
@@ -32,12 +52,34 @@ class DividendKings(BaseFilter):
         self.sell = arguments['args']['threshold_sell']
         self.lookback = arguments['args']['lookback']
         self.max_yield = arguments['args']['max_div_yield']
+        price_root = arguments.get('price_root', None)
+        self.price_store = PriceStore(price_root) if price_root else None
+        yield_db = arguments.get('yield_db', None)
+        self.yields = DividendYields(yield_db) if yield_db else None
         super(DividendKings, self).__init__(arguments, logger)
 
+    def close_at(self, symbol, date):
+        if self.price_store is not None:
+            return self.price_store.close_at(symbol, date)
+        price = Price.select(
+            lambda p: p.symbol.name == symbol
+            and p.date.date() == date.date()
+        ).first()
+        return price.close if price else None
+
     @db_session
     def analyse(self):
-        symbol = select(sym.name for sym in self.stock.price_item.symbols
-                        if Tag.YAO in sym.item.tags.name).first()
+        symbol = yahoo_symbol(self.stock)
+        self.calc = None
+        if self.yields is not None:
+            self.calc = self.yields.median(symbol, max_yield=self.max_yield)
+        if self.calc is None:
+            self.calc = self.median_yield(symbol)
+        if self.calc is None or math.isnan(self.calc):
+            raise RuntimeError("Couldn't calculate dividend yield.")
+        return super(DividendKings, self).analyse()
+
+    def median_yield(self, symbol):
         try:
             yao_item = yf.Ticker(symbol)
             data = yao_item.dividends
@@ -48,27 +90,21 @@ class DividendKings(BaseFilter):
         drop = []
         # let us calculate the dividend yield
         for my_date in dates:
-            price = Price.select(
-                    lambda p: p.symbol.name == symbol
-                    and p.date.date() == my_date.date()
-                ).first()
-            if price:
-                div_yield = (data[my_date] / price.close) * 100
+            close = self.close_at(symbol, my_date)
+            if close:
+                div_yield = (data[my_date] / close) * 100
                 if div_yield > self.max_yield:
                     drop.append(my_date)
                     self.logger.error(
                         '{} has a non plausible div yield at {} ({} = {} / {} * 100).'
-                        .format(symbol, my_date, div_yield, data[my_date], price.close)
+                        .format(symbol, my_date, div_yield, data[my_date], close)
                     )
                 else:
                     data[my_date] = div_yield
             else:
                 drop.append(my_date)
         data = data.drop(labels=drop)
-        self.calc = data.median(axis=0)
-        if self.calc is None or math.isnan(self.calc):
-            raise RuntimeError("Couldn't calculate dividend yield.")
-        return super(DividendKings, self).analyse()
+        return data.median(axis=0)
 
     def get_calculation(self):
         return self.calc
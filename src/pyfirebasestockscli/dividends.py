@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yfinance as yf
+
+from pyfirebasestockscli.prices import EPOCH, to_day
+from pyfirebasestockscli.storage import connect
+
+# dividend yields above this percentage are not plausible
+MAX_YIELD = 9
+# errors of single symbols, the same as BuildFilters catches
+SYMBOL_ERRORS = (
+    TypeError,
+    RuntimeError,
+    KeyError,
+    ZeroDivisionError,
+    IndexError,
+    ValueError,
+)
+
+
+def ex_days(dates):
+    """
+    Returns the epoch days of the dates of a dividend index
+    """
+    dates = getattr(dates, 'date', dates)
+    return np.fromiter((to_day(date) for date in dates), dtype=np.int64)
+
+
+def fetch_dividends(symbols, workers=1, logger=None):
+    """
+    Loads the dividends of all symbols from yfinance
+    """
+    logger = logger or logging.getLogger('firebase')
+
+    def fetch(symbol):
+        try:
+            return symbol, yf.Ticker(symbol).dividends
+        except SYMBOL_ERRORS:
+            logger.exception(f"Couldn't load dividends for {symbol}")
+            return symbol, None
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        return {
+            symbol: dividends
+            for symbol, dividends in pool.map(fetch, symbols)
+            if dividends is not None
+        }
+
+
+class DividendYields:
+    """
+    Stores the yield of each dividend at the close of its ex-date
+    """
+
+    TABLE = 'dividend_yield'
+    # symbols whose dividends were loaded, also without any dividends
+    FETCHED = 'dividend_fetched'
+
+    def __init__(
+        self, db_path, price_store=None, max_yield=MAX_YIELD, logger=None
+    ):
+        self.db_path = db_path
+        self.price_store = price_store
+        self.max_yield = max_yield
+        self.logger = logger or logging.getLogger('firebase')
+        with connect(db_path) as con:
+            con.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+                'symbol TEXT NOT NULL, ex_date TEXT NOT NULL, '
+                'amount REAL NOT NULL, close REAL, yield REAL, '
+                'plausible INTEGER NOT NULL, '
+                'PRIMARY KEY (symbol, ex_date)) WITHOUT ROWID'
+            )
+            con.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.FETCHED} ('
+                'symbol TEXT NOT NULL PRIMARY KEY) WITHOUT ROWID'
+            )
+
+    def compute(self, symbol, days, amounts):
+        """
+        Returns close, yield and plausible flag of each dividend, close
+        and yield are nan if there is no price at the ex-date
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        closes = self.price_store.closes_at(symbol, days)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            yields = amounts / closes * 100
+            plausible = yields <= self.max_yield
+        return closes, yields, plausible
+
+    def update(self, symbol, days, amounts):
+        """
+        Replaces the dividends of symbol
+        """
+        days = np.asarray(days, dtype=np.int64)
+        closes, yields, plausible = self.compute(symbol, days, amounts)
+        implausible = np.count_nonzero(~plausible & ~np.isnan(yields))
+        if implausible:
+            self.logger.error(
+                f'{symbol} has {implausible} non plausible div yields '
+                f'above {self.max_yield}%.'
+            )
+        dates = (np.datetime64(EPOCH, 'D') + days).astype(str)
+        rows = zip(
+            [symbol] * len(days),
+            dates.tolist(),
+            np.asarray(amounts, dtype=np.float64).tolist(),
+            # nan is stored as NULL
+            [None if np.isnan(close) else close for close in closes.tolist()],
+            [None if np.isnan(value) else value for value in yields.tolist()],
+            plausible.astype(int).tolist(),
+        )
+        with connect(self.db_path) as con:
+            con.execute(f'DELETE FROM {self.TABLE} WHERE symbol = ?', (symbol,))
+            con.executemany(
+                f'INSERT OR REPLACE INTO {self.TABLE} VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+            con.execute(
+                f'INSERT OR REPLACE INTO {self.FETCHED} VALUES (?)', (symbol,)
+            )
+
+    def refresh(self, dividends):
+        """
+        Recomputes the yields of a {symbol: yfinance dividends} mapping
+        """
+        for symbol, series in dividends.items():
+            self.update(symbol, ex_days(series.index), series.values)
+        self.logger.info(f'Updated dividend yields of {len(dividends)} symbols')
+
+    def fetched(self, symbols):
+        """
+        Returns the symbols whose dividends were loaded
+        """
+        found = set()
+        with connect(self.db_path) as con:
+            for idx in range(0, len(symbols), 500):
+                chunk = symbols[idx : idx + 500]
+                marks = ', '.join('?' * len(chunk))
+                rows = con.execute(
+                    f'SELECT symbol FROM {self.FETCHED} '
+                    f'WHERE symbol IN ({marks})',
+                    chunk,
+                )
+                found.update(symbol for symbol, in rows)
+        return found
+
+    def _select(self, symbols, since, max_yield):
+        """
+        Returns {symbol: (ex-dates, yields)} of the plausible dividends of
+        all symbols with dividends
+        """
+        since = str(since or EPOCH)[:10]
+        result = {}
+        with connect(self.db_path) as con:
+            for idx in range(0, len(symbols), 500):
+                chunk = symbols[idx : idx + 500]
+                marks = ', '.join('?' * len(chunk))
+                rows = con.execute(
+                    f'SELECT symbol, ex_date, yield, plausible '
+                    f'FROM {self.TABLE} '
+                    f'WHERE symbol IN ({marks}) AND ex_date >= ? '
+                    'ORDER BY symbol, ex_date',
+                    (*chunk, since),
+                )
+                for symbol, date, value, plausible in rows:
+                    dates, values = result.setdefault(symbol, ([], []))
+                    if max_yield is None:
+                        plausible = bool(plausible)
+                    else:
+                        plausible = value is not None and value <= max_yield
+                    if plausible:
+                        dates.append(date)
+                        values.append(value)
+        return {
+            symbol: (dates, np.array(values, dtype=np.float64))
+            for symbol, (dates, values) in result.items()
+        }
+
+    def yields(self, symbol, since=None, max_yield=None):
+        """
+        Returns ex-dates and yields of the plausible dividends of symbol
+        and None if there are no dividends of symbol
+        """
+        return self._select([symbol], since, max_yield).get(symbol)
+
+    def medians(self, symbols, since=None, max_yield=None):
+        """
+        Median yield of the plausible dividends since the given date, nan
+        without plausible dividends and None if the dividends of the symbol
+        were never loaded
+        """
+        symbols = list(symbols)
+        selected = self._select(symbols, since, max_yield)
+        fetched = self.fetched([sym for sym in symbols if sym not in selected])
+        medians = {}
+        for symbol in symbols:
+            if symbol not in selected:
+                medians[symbol] = float('nan') if symbol in fetched else None
+                continue
+            _, values = selected[symbol]
+            medians[symbol] = (
+                float(np.median(values)) if len(values) else float('nan')
+            )
+        return medians
+
+    def median(self, symbol, since=None, max_yield=None):
+        return self.medians([symbol], since, max_yield)[symbol]
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import json
+import operator
+import os
+import uuid
+from collections import defaultdict
+
+from pyfirebasestockscli import backend
+
+# default commit latency if no commits were recorded yet
+DEFAULT_COMMIT_SECONDS = 0.5
+
+
+def value_size(value):
+    """
+    Storage size of a firestore value, see
+    https://firebase.google.com/docs/firestore/storage-size
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode()) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, datetime.datetime):
+        return 8
+    if isinstance(value, dict):
+        return sum(
+            len(str(key).encode()) + 1 + value_size(item)
+            for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    return len(str(value).encode()) + 1
+
+
+def document_size(path, data):
+    name = sum(len(part.encode()) + 1 for part in path.split('/')) + 16
+    return name + value_size(data) + 32
+
+
+def merge_fields(current, data):
+    # set(..., merge=True) merges nested maps
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(current.get(key), dict):
+            merge_fields(current[key], value)
+        else:
+            current[key] = value
+
+
+class LatencyLog:
+    """
+    Persists the commit latencies of real runs to project dry runs
+    """
+
+    MAX_SAMPLES = 500
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r') as f:
+                self.samples = [tuple(item) for item in json.load(f)]
+        except (OSError, ValueError):
+            self.samples = []
+
+    def save(self, samples):
+        self.samples = (self.samples + list(samples))[-self.MAX_SAMPLES:]
+        with open(self.path, 'w') as f:
+            json.dump(self.samples, f)
+
+    def model(self):
+        """
+        Least squares fit of seconds = fixed + per_write * writes
+        """
+        if not self.samples:
+            return DEFAULT_COMMIT_SECONDS, 0.0
+        count = len(self.samples)
+        mean_w = sum(w for w, _ in self.samples) / count
+        mean_s = sum(s for _, s in self.samples) / count
+        var = sum((w - mean_w) ** 2 for w, _ in self.samples)
+        if not var:
+            return mean_s, 0.0
+        per_write = (
+            sum((w - mean_w) * (s - mean_s) for w, s in self.samples) / var
+        )
+        per_write = max(per_write, 0.0)
+        return max(mean_s - per_write * mean_w, 0.0), per_write
+
+    def estimate(self, batches):
+        fixed, per_write = self.model()
+        return sum(fixed + per_write * writes for writes in batches)
+
+
+class WritePlan:
+    def __init__(self, diff=False):
+        self.diff = diff
+        self.collections = defaultdict(lambda: defaultdict(int))
+        self.batches = []
+        self.deletes = 0
+
+    def read(self, collection):
+        self.collections[collection]['reads'] += 1
+
+    def delete(self, collection, batched=False):
+        self.collections[collection]['deletes'] += 1
+        if not batched:
+            self.deletes += 1
+
+    def write(self, collection, path, data, merge, current):
+        stats = self.collections[collection]
+        stats['updates' if merge else 'writes'] += 1
+        stats['bytes'] += document_size(path, data)
+        if not self.diff:
+            return
+        if current is None:
+            stats['added'] += 1
+            return
+        changed = [
+            key for key, value in data.items() if current.get(key) != value
+        ]
+        if changed:
+            stats['changed'] += 1
+            stats['changed_fields'] += len(changed)
+        else:
+            stats['unchanged'] += 1
+
+    def commit(self, writes):
+        self.batches.append(writes)
+
+    def summary(self, latencies=None):
+        # each unbatched delete is its own round trip
+        round_trips = self.batches + [1] * self.deletes
+        plan = {
+            'collections': {
+                name: dict(stats) for name, stats in self.collections.items()
+            },
+            'batches': len(self.batches),
+            'writes': sum(self.batches),
+            'deletes': self.deletes,
+        }
+        if latencies is not None:
+            plan['estimated_seconds'] = round(
+                latencies.estimate(round_trips), 1
+            )
+            plan['latency_samples'] = len(latencies.samples)
+        return plan
+
+
+# operators of recorded queries
+QUERY_OPS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda field, values: field in values,
+    'array_contains': operator.contains,
+}
+
+
+class RecordingReference:
+    def __init__(self, recorder, collection, doc_id, current=None):
+        self.recorder = recorder
+        self.collection = collection
+        self.id = doc_id
+        self.current = current
+
+    @property
+    def path(self):
+        return f'{self.collection}/{self.id}'
+
+    def delete(self, batched=False):
+        self.recorder.deleted.add(self.path)
+        self.recorder.plan.delete(self.collection, batched)
+
+
+class RecordingSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class RecordingCollection:
+    def __init__(self, recorder, name, limit=None, filters=()):
+        self.recorder = recorder
+        self.name = name
+        self._limit = limit
+        self._filters = tuple(filters)
+
+    def limit(self, count):
+        return RecordingCollection(
+            self.recorder, self.name, count, self._filters
+        )
+
+    def where(self, field, op, value):
+        if op not in QUERY_OPS:
+            raise ValueError(f'Unsupported query operator {op}.')
+        return RecordingCollection(
+            self.recorder,
+            self.name,
+            self._limit,
+            self._filters + ((field, QUERY_OPS[op], value),),
+        )
+
+    def _matches(self, data):
+        return all(
+            field in data and op(data[field], value)
+            for field, op, value in self._filters
+        )
+
+    def document(self, doc_id=None):
+        return RecordingReference(
+            self.recorder, self.name, doc_id or uuid.uuid4().hex
+        )
+
+    def stream(self):
+        count = 0
+        for snapshot in self.recorder.snapshots(self.name):
+            if self._limit is not None and count >= self._limit:
+                return
+            if snapshot.reference.path in self.recorder.deleted:
+                continue
+            if not self._matches(snapshot.to_dict()):
+                continue
+            count += 1
+            self.recorder.plan.read(self.name)
+            yield snapshot
+
+
+class RecordingBatch:
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.writes = []
+
+    def set(self, reference, data, merge=False):
+        self.writes.append((reference, data, merge))
+
+    def delete(self, reference):
+        self.writes.append((reference, None, None))
+
+    def commit(self):
+        for reference, data, merge in self.writes:
+            if data is None:
+                reference.delete(batched=True)
+                continue
+            self.recorder.plan.write(
+                reference.collection,
+                reference.path,
+                data,
+                merge,
+                reference.current,
+            )
+            self.recorder.apply(reference, data, merge)
+        self.recorder.plan.commit(len(self.writes))
+        self.writes = []
+
+
+class RecordingClient:
+    """
+    Reads from firestore once per collection and records all writes and
+    deletes in a write plan instead of sending them
+    """
+
+    def __init__(self, client_factory=None, diff=False):
+        self.client_factory = client_factory
+        self.plan = WritePlan(diff)
+        self.deleted = set()
+        self._snapshots = {}
+
+    def snapshots(self, name):
+        if name not in self._snapshots:
+            snapshots = []
+            if self.client_factory is not None:
+                for doc in self.client_factory().collection(name).stream():
+                    data = doc.to_dict()
+                    reference = RecordingReference(self, name, doc.id, data)
+                    snapshots.append(RecordingSnapshot(reference, data))
+            self._snapshots[name] = snapshots
+        return self._snapshots[name]
+
+    def apply(self, reference, data, merge):
+        """
+        Makes recorded writes visible to later reads of the same run
+        """
+        if reference.current is not None and merge:
+            merge_fields(reference.current, data)
+            return
+        reference.current = dict(data)
+        self.snapshots(reference.collection).append(
+            RecordingSnapshot(reference, reference.current)
+        )
+
+    def collection(self, name):
+        return RecordingCollection(self, name)
+
+    def batch(self):
+        return RecordingBatch(self)
+
+
+def latency_path(db_path):
+    return os.path.join(os.path.dirname(db_path), 'firestore_latency.json')
+
+
+def save_latencies(db_path):
+    if backend.commit_latencies:
+        LatencyLog(latency_path(db_path)).save(backend.commit_latencies)
+        del backend.commit_latencies[:]
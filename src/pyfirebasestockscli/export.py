@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+
+PRICE_KEYS = ('last_price_eur', 'last_price_usd')
+
+
+class ColumnarExport:
+    """
+    Streams the sync payloads into a date partitioned parquet or arrow file
+    """
+
+    FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+    def __init__(self, root, fmt='parquet', batch_size=400, shard=0,
+                 date=None, logger=None):
+        if fmt not in self.FORMATS:
+            raise ValueError(f'Unknown export format {fmt}.')
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError(
+                'Columnar export needs pyarrow '
+                '(pip install pyfirebasestockscli[export]).'
+            )
+        self.pa = pyarrow
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.logger = logger
+        date = date or datetime.date.today()
+        folder = os.path.join(root, 'date={}'.format(date.strftime('%Y-%m-%d')))
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(
+            folder, 'stocks-{}.{}'.format(shard, self.FORMATS[fmt])
+        )
+        self.rows = []
+        # schemas of the written part files
+        self.parts = []
+        self.count = 0
+
+    def add(self, name, payload):
+        row = dict(payload)
+        row['name'] = name
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def _build_schema(self, rows):
+        pa = self.pa
+        price_type = pa.map_(pa.string(), pa.float64())
+        fields = [
+            pa.field('name', pa.string()),
+            pa.field('date', pa.string()),
+        ]
+        fields += [pa.field(key, price_type) for key in PRICE_KEYS]
+        filter_keys = sorted(
+            {key for row in rows for key in row
+             if key.endswith('_value') or key.endswith('_status')}
+        )
+        for key in filter_keys:
+            if key.endswith('_status'):
+                fields.append(pa.field(key, pa.int64()))
+            else:
+                fields.append(pa.field(key, pa.float64()))
+        return pa.schema(fields)
+
+    def _part_path(self, idx):
+        return f'{self.path}.{idx}.part'
+
+    def flush(self):
+        """
+        Writes the buffered rows to a part file with the columns of this
+        batch, close() merges the parts
+        """
+        if not self.rows:
+            return
+        schema = self._build_schema(self.rows)
+        columns = {}
+        for field in schema:
+            if field.name in PRICE_KEYS:
+                columns[field.name] = [
+                    list((row.get(field.name) or {}).items())
+                    for row in self.rows
+                ]
+            else:
+                columns[field.name] = [
+                    row.get(field.name) for row in self.rows
+                ]
+        batch = self.pa.RecordBatch.from_pydict(columns, schema=schema)
+        path = self._part_path(len(self.parts))
+        with self.pa.ipc.new_file(path, schema) as writer:
+            writer.write_batch(batch)
+        self.parts.append(schema)
+        self.count += len(self.rows)
+        self.rows = []
+
+    def _unify(self):
+        fields = {}
+        for schema in self.parts:
+            for field in schema:
+                fields.setdefault(field.name, field)
+        fixed = ['name', 'date'] + list(PRICE_KEYS)
+        names = fixed + sorted(set(fields) - set(fixed))
+        return self.pa.schema([fields[name] for name in names])
+
+    def _open_writer(self, schema):
+        tmp_path = self.path + '.tmp'
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            return pq.ParquetWriter(tmp_path, schema)
+        return self.pa.ipc.new_file(tmp_path, schema)
+
+    def close(self):
+        self.flush()
+        if not self.parts:
+            return None
+        pa = self.pa
+        schema = self._unify()
+        writer = self._open_writer(schema)
+        for idx in range(len(self.parts)):
+            path = self._part_path(idx)
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                for batch_idx in range(reader.num_record_batches):
+                    batch = reader.get_batch(batch_idx)
+                    names = batch.schema.names
+                    # columns of later batches are null in earlier ones
+                    arrays = [
+                        batch.column(names.index(field.name))
+                        if field.name in names
+                        else pa.nulls(batch.num_rows, field.type)
+                        for field in schema
+                    ]
+                    writer.write_batch(
+                        pa.RecordBatch.from_arrays(arrays, schema=schema)
+                    )
+            os.remove(path)
+        writer.close()
+        os.replace(self.path + '.tmp', self.path)
+        self.parts = []
+        return self.path
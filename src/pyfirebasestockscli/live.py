@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import time
+
+from pyfirebasestockscli.backend import commit, get_client
+from pyfirebasestockscli.payload import PRICE_KEYS
+from pyfirebasestockscli.storage import connect
+
+
+class LivePricePush:
+    """
+    Watches the price table of the local database and pushes the latest
+    price of changed symbols to their stock documents
+    """
+
+    MAX_UPDATES = 400
+
+    def __init__(self, db_path, logger, window=30, interval=5):
+        self.db_path = db_path
+        self.logger = logger
+        self.window = window
+        self.interval = interval
+        self.last_id = None
+        # symbol, date and close of the last row, a rebuilt price table
+        # has other rows at this id
+        self.last_row = None
+        self.pending = {}
+        self.pending_since = None
+        self.pushed = {}
+        self.symbol_docs = None
+
+    def _load_docs(self):
+        self.symbol_docs = {}
+        for doc in get_client().collection('stocks').stream():
+            doc_dict = doc.to_dict()
+            for price_key, symbols_key in PRICE_KEYS:
+                for symbol in doc_dict.get(symbols_key) or []:
+                    self.symbol_docs[symbol] = (doc.reference, price_key)
+
+    @staticmethod
+    def _row(con, row_id):
+        return con.execute(
+            'SELECT symbol, date, close FROM "Price" WHERE id = ?', (row_id,)
+        ).fetchone()
+
+    def poll(self):
+        """
+        Collects the prices inserted since the last poll, returns the
+        number of new rows
+        """
+        with connect(self.db_path) as con:
+            table = con.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'Price'"
+            ).fetchone()
+            if table is None:
+                # dropped while the database is rebuilt
+                return 0
+            if self.last_id is None:
+                row = con.execute('SELECT MAX(id) FROM "Price"').fetchone()
+                self.last_id = row[0] or 0
+                self.last_row = self._row(con, self.last_id)
+                return 0
+            if self._row(con, self.last_id) != self.last_row:
+                self.logger.info('Price table was rebuilt, read all prices')
+                self.last_id = 0
+                self.last_row = None
+            rows = con.execute(
+                'SELECT p.id, p.symbol, s.name, p.date, p.close '
+                'FROM "Price" p JOIN "Symbol" s ON p.symbol = s.id '
+                'WHERE p.id > ? ORDER BY p.id',
+                (self.last_id,),
+            ).fetchall()
+        for row_id, symbol_id, symbol, date, close in rows:
+            self.last_id = row_id
+            self.last_row = (symbol_id, date, close)
+            current = self.pending.get(symbol)
+            # keep the newest price of each symbol
+            if current is None or date >= current[0]:
+                self.pending[symbol] = (date, close)
+        if rows and self.pending_since is None:
+            self.pending_since = time.monotonic()
+        return len(rows)
+
+    def due(self):
+        return (
+            self.pending_since is not None
+            and time.monotonic() - self.pending_since >= self.window
+        )
+
+    def flush(self):
+        """
+        Pushes the coalesced prices, returns the number of updated fields
+        """
+        pending, self.pending, self.pending_since = self.pending, {}, None
+        updates = {}
+        count = 0
+        reloaded = False
+        for symbol, (_, close) in pending.items():
+            if self.pushed.get(symbol) == close:
+                continue
+            # new stock documents are picked up once per flush
+            if self.symbol_docs is None or (
+                symbol not in self.symbol_docs and not reloaded
+            ):
+                self._load_docs()
+                reloaded = True
+            if symbol not in self.symbol_docs:
+                self.logger.info(f'No stock document for {symbol}.')
+                continue
+            reference, price_key = self.symbol_docs[symbol]
+            # one write per stock document
+            _, data, symbols = updates.setdefault(
+                reference.path, (reference, {}, [])
+            )
+            data.setdefault(price_key, {})[symbol] = close
+            symbols.append((symbol, close))
+            count += 1
+        store = get_client()
+        updates = list(updates.values())
+        for idx in range(0, len(updates), self.MAX_UPDATES):
+            chunk = updates[idx : idx + self.MAX_UPDATES]
+            batch = store.batch()
+            for reference, data, _ in chunk:
+                # merge only touches the prices of these symbols
+                batch.set(reference, data, merge=True)
+            commit(batch, len(chunk))
+            for _, _, symbols in chunk:
+                self.pushed.update(symbols)
+        if count:
+            self.logger.info(
+                f'Pushed {count} prices of {len(updates)} stocks'
+            )
+        return count
+
+    def run(self, stop=None):
+        self.poll()
+        try:
+            while stop is None or not stop():
+                self.poll()
+                if self.due():
+                    self.flush()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.flush()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import hashlib
+import json
+
+from pony.orm import db_session, max, select
+from pystockdb.db.schema.stocks import Price, Signal, Symbol, Tag
+
+from pyfirebasestockscli.storage import connect
+
+
+@db_session
+def data_versions(symbols, fundamentals=None):
+    """
+    Returns the date of the last price and the last fundamentals refresh
+    for each symbol
+    """
+    fundamentals = fundamentals or {}
+    last_prices = dict(
+        select(
+            (p.symbol.name, max(p.date))
+            for p in Price
+            if p.symbol.name in symbols
+        )
+    )
+    return {
+        sym: (
+            str(last_prices.get(sym)),
+            str(fundamentals.get(sym)),
+        )
+        for sym in symbols
+    }
+
+
+@db_session
+def signal_symbols(symbols, names, since):
+    """
+    Returns the symbols with a signal of each filter name created since
+    the given date
+    """
+    found = {}
+    rows = select(
+        (sym.name, tag.name)
+        for sym in Symbol
+        for sig in Signal
+        for tag in Tag
+        if sym.name in symbols
+        and sym.price_item in sig.price_items
+        and tag in sig.item.tags
+        and tag.name in names
+        and sig.result.date >= since
+    )
+    for sym, name in rows:
+        found.setdefault(sym, set()).add(name)
+    names = set(names)
+    return [sym for sym in symbols if found.get(sym) == names]
+
+
+def signal_name(signal):
+    return next(iter(signal.item.tags)).name
+
+
+def newest_first(signals):
+    return sorted(signals, key=lambda sig: sig.result.date, reverse=True)
+
+
+def _delete_signal(signal):
+    result, item = signal.result, signal.item
+    for argument in list(result.arguments):
+        argument_item = argument.item
+        argument.delete()
+        argument_item.delete()
+    signal.delete()
+    item.delete()
+    result.delete()
+
+
+@db_session
+def prune_signals(symbols):
+    """
+    Deletes all but the newest signal of each filter of the symbols,
+    BuildFilters adds new signals on every run
+    """
+    price_items = select(
+        sym.price_item for sym in Symbol if sym.name in symbols
+    )
+    pruned = 0
+    for price_item in price_items:
+        names = set()
+        for signal in newest_first(price_item.signals):
+            name = signal_name(signal)
+            if name in names:
+                _delete_signal(signal)
+                pruned += 1
+            else:
+                names.add(name)
+    return pruned
+
+
+class FilterCache:
+    """
+    Remembers which filters already ran on the current data of a symbol.
+    Entries expire after ttl days and the least recently used entries
+    are evicted above max_entries.
+    """
+
+    TABLE = 'filter_cache'
+
+    def __init__(self, db_path, ttl=7, max_entries=100000, logger=None):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as con:
+            con.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} '
+                '(key TEXT PRIMARY KEY, symbol TEXT NOT NULL, '
+                'created REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().timestamp()
+
+    @staticmethod
+    def key(symbol, name, args, version):
+        raw = json.dumps(
+            [symbol, name, args, list(version)], sort_keys=True, default=str
+        )
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _keys(self, name, args, versions):
+        return {
+            sym: self.key(sym, name, args, version)
+            for sym, version in versions.items()
+        }
+
+    def stale(self, name, args, versions):
+        """
+        Returns all symbols which need a new filter run
+        """
+        keys = self._keys(name, args, versions)
+        now = self._now()
+        min_created = now - self.ttl * 86400
+        with self._connect() as con:
+            known = set()
+            items = list(keys.values())
+            for idx in range(0, len(items), 500):
+                chunk = items[idx : idx + 500]
+                rows = con.execute(
+                    'SELECT key FROM {} WHERE created >= ? AND key IN ({})'
+                    .format(self.TABLE, ','.join('?' * len(chunk))),
+                    [min_created] + chunk,
+                ).fetchall()
+                known.update(row[0] for row in rows)
+            con.executemany(
+                f'UPDATE {self.TABLE} SET accessed = ? WHERE key = ?',
+                [(now, key) for key in known],
+            )
+        stale = [sym for sym, key in keys.items() if key not in known]
+        self.hits += len(keys) - len(stale)
+        self.misses += len(stale)
+        return stale
+
+    def clear(self):
+        with self._connect() as con:
+            con.execute(f'DELETE FROM {self.TABLE}')
+
+    def store(self, name, args, versions, symbols):
+        keys = self._keys(name, args, versions)
+        now = self._now()
+        with self._connect() as con:
+            con.executemany(
+                f'INSERT OR REPLACE INTO {self.TABLE} '
+                '(key, symbol, created, accessed) VALUES (?, ?, ?, ?)',
+                [(keys[sym], sym, now, now) for sym in symbols],
+            )
+            self._evict(con, now)
+
+    def _evict(self, con, now):
+        con.execute(
+            f'DELETE FROM {self.TABLE} WHERE created < ?',
+            (now - self.ttl * 86400,),
+        )
+        con.execute(
+            f'DELETE FROM {self.TABLE} WHERE key IN '
+            f'(SELECT key FROM {self.TABLE} ORDER BY accessed DESC, rowid DESC '
+            'LIMIT -1 OFFSET ?)',
+            (self.max_entries,),
+        )
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def log_stats(self):
+        if self.logger:
+            self.logger.info(
+                f'Filter cache: {self.hits} hits, {self.misses} misses '
+                f'({self.hit_rate():.0%} hit rate)'
+            )
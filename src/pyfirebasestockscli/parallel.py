@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pystockfilter.base.base_helper import BaseHelper
+from pystockfilter.tool.build_filters import BuildFilters
+from pystockfilter.tool.build_internal_filters import BuildInternalFilters
+
+from pyfirebasestockscli.dividend_kings import DividendKings
+from pyfirebasestockscli.storage import bind_database, register_profile
+
+_worker_logger = None
+
+
+def chunk_symbols(symbols, count):
+    """
+    Splits symbols round robin into count chunks
+    """
+    chunks = [symbols[idx::count] for idx in range(count)]
+    return [chunk for chunk in chunks if chunk]
+
+
+def internal_filter_names():
+    filters = BuildInternalFilters({}, logging.getLogger('firebase'))
+    return [my_filter.name for my_filter in filters.builder.filters]
+
+
+def build_each(builder, symbols):
+    """
+    Runs the filters of a BuildFilters builder symbol by symbol and filter
+    by filter. Each build is a short db_session, so the signals of one
+    filter are committed at once and the write lock of sqlite is only held
+    while they are stored.
+    """
+    filters = builder.filters
+    try:
+        for symbol in symbols:
+            builder.symbols = [symbol]
+            for my_filter in filters:
+                builder.set_filters([my_filter])
+                builder.build()
+    finally:
+        builder.set_filters(filters)
+
+
+def _init_worker(db_args, level):
+    global _worker_logger
+    _worker_logger = BaseHelper.setup_logger('firebase')
+    _worker_logger.setLevel(level)
+    # busy timeout and WAL for the connections of this process
+    register_profile()
+    bind_database(db_args)
+
+
+def _build_internal(symbols):
+    try:
+        build_each(BuildInternalFilters({}, _worker_logger).builder, symbols)
+    except Exception as exc:
+        # pony exceptions can't be unpickled by the pool
+        raise RuntimeError(repr(exc)) from None
+    return len(symbols)
+
+
+class ParallelFilterRunner:
+    """
+    Runs the internal filters in a process pool and the custom filters,
+    which are mostly waiting for yfinance, in a thread pool
+    """
+
+    def __init__(self, db_args, workers=1, logger=None):
+        self.db_args = db_args
+        self.workers = max(workers, 1)
+        self.logger = logger or logging.getLogger('firebase')
+
+    def _log_time(self, name, symbols, start):
+        self.logger.info(
+            f'{name}: {len(symbols)} symbols in '
+            f'{time.perf_counter() - start:.1f}s '
+            f'with {self.workers} workers'
+        )
+
+    def run_internal(self, symbols):
+        start = time.perf_counter()
+        if self.workers == 1:
+            BuildInternalFilters({'symbols': symbols}, self.logger).build()
+        else:
+            # spawn keeps the pony connections of the parent out of the
+            # workers
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(
+                self.workers,
+                initializer=_init_worker,
+                initargs=(self.db_args, self.logger.level),
+            ) as pool:
+                pool.map(_build_internal, chunk_symbols(symbols, self.workers))
+        self._log_time('Internal filters', symbols, start)
+
+    def _build_custom(self, symbols, arguments):
+        config = {'filters': [DividendKings(arguments, self.logger)]}
+        build_each(BuildFilters(config, self.logger), symbols)
+
+    def run_custom(self, symbols, arguments):
+        start = time.perf_counter()
+        if self.workers == 1:
+            config = {
+                'symbols': symbols,
+                'filters': [DividendKings(arguments, self.logger)],
+            }
+            BuildFilters(config, self.logger).build()
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [
+                    pool.submit(self._build_custom, chunk, arguments)
+                    for chunk in chunk_symbols(symbols, self.workers)
+                ]
+                for future in futures:
+                    future.result()
+        self._log_time('Custom filters', symbols, start)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import sys
+
+PRICE_KEYS = (
+    ('last_price_eur', 'symbols_eur'),
+    ('last_price_usd', 'symbols_usd'),
+)
+
+
+def run_date(now=None):
+    return (now or datetime.datetime.now()).strftime('%m/%d/%Y')
+
+
+class StockDoc:
+    """
+    Keeps only the fields of a firestore stock document the sync needs
+    """
+
+    __slots__ = ('reference', 'symbols_eur', 'symbols_usd')
+
+    def __init__(self, reference, symbols_eur, symbols_usd):
+        self.reference = reference
+        self.symbols_eur = symbols_eur
+        self.symbols_usd = symbols_usd
+
+    @classmethod
+    def from_snapshot(cls, doc, doc_dict):
+        return cls(
+            doc.reference, doc_dict['symbols_eur'], doc_dict['symbols_usd']
+        )
+
+
+class PayloadBuilder:
+    """
+    Builds the flat sync documents with one date and one set of interned
+    key strings per run
+    """
+
+    __slots__ = ('date', 'keys', 'last_price', 'warn')
+
+    def __init__(self, last_price, warn=None, date=None):
+        self.date = date or run_date()
+        self.keys = {}
+        self.last_price = last_price
+        self.warn = warn
+
+    def signal_keys(self, name):
+        keys = self.keys.get(name)
+        if keys is None:
+            keys = (
+                sys.intern(f'{name}_value'),
+                sys.intern(f'{name}_status'),
+            )
+            self.keys[name] = keys
+        return keys
+
+    def build(self, name, signals, doc):
+        """
+        signals yields (signal name, value, status), the first signal of
+        a name wins
+        """
+        stock = {
+            'date': self.date,
+            'last_price_usd': None,
+            'last_price_eur': None,
+        }
+        # add signals to document in a flat way to simplify queries
+        for signal_name, value, status in signals:
+            value_key, status_key = self.signal_keys(signal_name)
+            if value_key not in stock:
+                stock[value_key] = value
+                stock[status_key] = status
+        for price_key, symbols_key in PRICE_KEYS:
+            prices = {}
+            for symbol in getattr(doc, symbols_key):
+                price = self.last_price(symbol)
+                if price is None and self.warn:
+                    self.warn(symbol, name)
+                prices[symbol] = price
+            stock[price_key] = prices
+        return stock
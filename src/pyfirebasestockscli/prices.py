@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+
+import numpy as np
+
+from pyfirebasestockscli.storage import connect
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def to_day(date):
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return (date - EPOCH).days
+
+
+def parse_day(value):
+    # pony stores datetimes as iso strings in sqlite
+    return to_day(datetime.datetime.strptime(value[:10], '%Y-%m-%d').date())
+
+
+class PriceStore:
+    """
+    Keeps the (day, close) series of each symbol as memory mapped numpy
+    arrays next to the sqlite database
+    """
+
+    def __init__(self, root, db_path=None):
+        self.root = root
+        self.db_path = db_path
+        self.series = {}
+
+    def _path(self, symbol, kind):
+        name = symbol.replace(os.sep, '_')
+        return os.path.join(self.root, f'{name}.{kind}.npy')
+
+    def _load(self, symbol):
+        if symbol not in self.series:
+            try:
+                self.series[symbol] = (
+                    np.load(self._path(symbol, 'days'), mmap_mode='r'),
+                    np.load(self._path(symbol, 'close'), mmap_mode='r'),
+                )
+            except OSError:
+                self.series[symbol] = (
+                    np.empty(0, dtype=np.int32),
+                    np.empty(0, dtype=np.float64),
+                )
+        return self.series[symbol]
+
+    def _save(self, symbol, days, closes):
+        # drops the memory maps before the files are replaced
+        self.series.pop(symbol, None)
+        os.makedirs(self.root, exist_ok=True)
+        for kind, values in (('days', days), ('close', closes)):
+            path = self._path(symbol, kind)
+            tmp_path = path + '.tmp.npy'
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """
+        Deletes all series, the prices of a new database start again
+        """
+        self.series.clear()
+        if not os.path.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(self.root, name))
+
+    def refresh(self, symbols):
+        """
+        Appends all prices newer than the last stored day of each symbol
+        """
+        with connect(self.db_path) as con:
+            for symbol in symbols:
+                days, closes = self._load(symbol)
+                last = int(days[-1]) if len(days) else -1
+                since = (EPOCH + datetime.timedelta(days=last + 1)).isoformat()
+                rows = con.execute(
+                    'SELECT p.date, p.close FROM "Price" p '
+                    'JOIN "Symbol" s ON p.symbol = s.id '
+                    'WHERE s.name = ? AND p.date >= ? ORDER BY p.date',
+                    (symbol, since),
+                ).fetchall()
+                if not rows:
+                    continue
+                new_days = np.fromiter(
+                    (parse_day(date) for date, _ in rows), dtype=np.int32
+                )
+                new_closes = np.fromiter(
+                    (close for _, close in rows), dtype=np.float64
+                )
+                # keep the last price of a day
+                keep = np.append(new_days[1:] != new_days[:-1], True)
+                self._save(
+                    symbol,
+                    np.concatenate((days, new_days[keep])),
+                    np.concatenate((closes, new_closes[keep])),
+                )
+
+    def missing(self, symbols):
+        """
+        Returns the symbols without any price in the database
+        """
+        with connect(self.db_path) as con:
+            rows = con.execute(
+                'SELECT DISTINCT s.name FROM "Symbol" s '
+                'JOIN "Price" p ON p.symbol = s.id'
+            ).fetchall()
+        priced = {name for name, in rows}
+        return [symbol for symbol in symbols if symbol not in priced]
+
+    def latest(self, symbol):
+        _, closes = self._load(symbol)
+        if not len(closes):
+            return None
+        return float(closes[-1])
+
+    def close_at(self, symbol, date):
+        days, closes = self._load(symbol)
+        day = to_day(date)
+        idx = np.searchsorted(days, day)
+        if idx < len(days) and days[idx] == day:
+            return float(closes[idx])
+        return None
+
+    def closes_at(self, symbol, days):
+        """
+        Returns the close of each epoch day in days, nan if there is no
+        price of that day
+        """
+        stored_days, closes = self._load(symbol)
+        days = np.asarray(days, dtype=np.int64)
+        result = np.full(len(days), np.nan)
+        if not len(stored_days):
+            return result
+        idx = np.searchsorted(stored_days, days)
+        found = idx < len(stored_days)
+        found[found] = stored_days[idx[found]] == days[found]
+        result[found] = closes[idx[found]]
+        return result
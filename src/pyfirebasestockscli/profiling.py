@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import cProfile
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+def frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', code.co_filename)
+    return f'{module}:{code.co_name}'
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the stack of one thread and counts the collapsed stacks
+    """
+
+    def __init__(self, thread_id, interval, prefix):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.prefix = prefix
+        self.counts = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                stack.append(self.prefix)
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class StageProfiler:
+    """
+    Profiles stages with a sampling profiler (collapsed stacks for
+    flamegraph tools) or cProfile (.prof files) and writes the pony
+    query statistics of each stage
+    """
+
+    MODES = ('sample', 'cprofile')
+
+    def __init__(self, root, mode='sample', interval=0.005):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown profile mode {mode}.')
+        self.root = root
+        self.mode = mode
+        self.interval = interval
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, stage, suffix):
+        return os.path.join(self.root, f'{stage}.{suffix}')
+
+    @staticmethod
+    def _database():
+        try:
+            from pystockdb.db.schema.stocks import db
+        except ImportError:
+            return None
+        return db
+
+    @contextmanager
+    def profile(self, stage):
+        db = self._database()
+        if db is not None:
+            # starts the per thread query statistics of this stage
+            db.merge_local_stats()
+        if self.mode == 'sample':
+            sampler = Sampler(threading.get_ident(), self.interval, stage)
+            sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if self.mode == 'sample':
+                sampler.stop()
+                self.write_collapsed(stage, sampler.counts)
+            else:
+                profiler.disable()
+                profiler.dump_stats(self._path(stage, 'prof'))
+            if db is not None:
+                self.write_queries(stage, db.local_stats.values())
+
+    def write_collapsed(self, stage, counts):
+        with open(self._path(stage, 'collapsed'), 'w') as f:
+            for stack, count in counts.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def write_queries(self, stage, stats):
+        stats = sorted(stats, key=lambda stat: stat.sum_time, reverse=True)
+        with open(self._path(stage, 'sql.tsv'), 'w') as f:
+            f.write('count\tsum_time\tavg_time\tmax_time\tsql\n')
+            for stat in stats:
+                if stat.sql is None:
+                    # merge_local_stats adds the total of all queries
+                    continue
+                sql = ' '.join(stat.sql.split())
+                f.write(
+                    f'{stat.db_count}\t{stat.sum_time:.6f}\t'
+                    f'{stat.avg_time:.6f}\t{stat.max_time:.6f}\t{sql}\n'
+                )
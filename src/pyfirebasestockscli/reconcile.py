@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+
+# document fields derived from the local database
+STOCK_FIELDS = ('symbols_eur', 'symbols_usd', 'country', 'tags', 'indices')
+
+
+def signature(doc):
+    return tuple(
+        tuple(sorted(value)) if isinstance(value, list) else value
+        for value in (doc.get(field) for field in STOCK_FIELDS)
+    )
+
+
+class Reconciliation:
+    """
+    Compares the local stocks with the firestore stock documents
+    """
+
+    def __init__(self, added=(), changed=(), removed=()):
+        # names of stocks without document
+        self.added = list(added)
+        # (name, document snapshot) of stocks with outdated fields
+        self.changed = list(changed)
+        # snapshots of documents without local stock or duplicates
+        self.removed = list(removed)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return (
+            f'Reconciliation(added={len(self.added)}, '
+            f'changed={len(self.changed)}, removed={len(self.removed)})'
+        )
+
+    @classmethod
+    def compute(cls, local_docs, snapshots, local_names):
+        """
+        local_docs maps the names of the stocks to check to their
+        document fields, snapshots are all stock documents and
+        local_names are the names of all local stocks
+        """
+        remote = {}
+        removed = []
+        for snapshot in snapshots:
+            doc_dict = snapshot.to_dict()
+            if doc_dict['name'] in remote:
+                removed.append(snapshot)
+            else:
+                remote[doc_dict['name']] = (signature(doc_dict), snapshot)
+        local = {name: signature(doc) for name, doc in local_docs.items()}
+        added = sorted(local.keys() - remote.keys())
+        changed = [
+            (name, remote[name][1])
+            for name in sorted(local.keys() & remote.keys())
+            if local[name] != remote[name][0]
+        ]
+        removed += [
+            remote[name][1] for name in sorted(remote.keys() - set(local_names))
+        ]
+        return cls(added, changed, removed)
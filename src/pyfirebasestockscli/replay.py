@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import lzma
+import pickle
+import threading
+
+import yfinance
+
+from pyfirebasestockscli import backend
+from pyfirebasestockscli.dryrun import RecordingClient
+
+# marks attributes of a ticker which are methods
+METHOD = '__method__'
+# download arguments which depend on the day of the run
+DATE_ARGS = ('start', 'end')
+
+
+def _key(*parts):
+    return repr(parts)
+
+
+class Archive:
+    """
+    Stores the responses of yfinance and firestore in a lzma compressed
+    pickle file
+    """
+
+    MODES = ('record', 'replay')
+
+    def __init__(self, path, mode):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown archive mode {mode}.')
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.data = {'responses': {}, 'collections': {}, 'timings': []}
+        if mode == 'replay':
+            with lzma.open(path, 'rb') as f:
+                self.data = pickle.load(f)
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    def record(self, key, value):
+        with self.lock:
+            self.data['responses'][key] = value
+        return value
+
+    def lookup(self, key):
+        try:
+            return self.data['responses'][key]
+        except KeyError:
+            raise RuntimeError(f'Response {key} was not recorded.')
+
+    def record_collection(self, name, snapshots):
+        # queries add their documents to the collection, the first read
+        # of a document wins
+        with self.lock:
+            collection = self.data['collections'].setdefault(name, {})
+            for doc_id, data in snapshots:
+                collection.setdefault(doc_id, data)
+
+    def add_timings(self, timings):
+        self.data['timings'].append(dict(timings))
+
+    def compare(self, timings):
+        """
+        Returns the recorded and the given seconds of each stage
+        """
+        recorded = self.data['timings'][0] if self.data['timings'] else {}
+        return {
+            name: {
+                'recorded': recorded.get(name),
+                'replayed': timings.get(name),
+            }
+            for name in sorted(recorded.keys() | timings.keys())
+        }
+
+    def save(self):
+        with lzma.open(self.path, 'wb') as f:
+            pickle.dump(self.data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class TickerProxy:
+    """
+    Records or replays all attributes and method calls of yfinance.Ticker
+    """
+
+    def __init__(self, archive, ticker_cls, symbol, *args, **kwargs):
+        self._archive = archive
+        self._symbol = symbol
+        self._ticker = None
+        if archive.recording:
+            self._ticker = ticker_cls(symbol, *args, **kwargs)
+
+    def __getattr__(self, name):
+        archive = self._archive
+        key = _key('ticker', self._symbol, name)
+        if archive.recording:
+            value = getattr(self._ticker, name)
+            if not callable(value):
+                return archive.record(key, value)
+            archive.record(key, METHOD)
+
+            def record_call(*args, **kwargs):
+                call_key = _key('ticker', self._symbol, name, args, kwargs)
+                return archive.record(call_key, value(*args, **kwargs))
+
+            return record_call
+        value = archive.lookup(key)
+        if value != METHOD:
+            return value
+
+        def replay_call(*args, **kwargs):
+            return archive.lookup(
+                _key('ticker', self._symbol, name, args, kwargs)
+            )
+
+        return replay_call
+
+
+class ArchiveSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class CapturingCollection:
+    def __init__(self, archive, collection, name):
+        self.archive = archive
+        self.collection = collection
+        self.name = name
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def where(self, field, op, value):
+        return CapturingCollection(
+            self.archive, self.collection.where(field, op, value), self.name
+        )
+
+    def stream(self):
+        snapshots = []
+        for doc in self.collection.stream():
+            snapshots.append((doc.id, doc.to_dict()))
+            yield doc
+        self.archive.record_collection(self.name, snapshots)
+
+
+class CapturingClient:
+    """
+    Passes everything to firestore and records full collection reads
+    """
+
+    def __init__(self, archive, client_factory=backend.firestore_client):
+        self.archive = archive
+        self.client_factory = client_factory
+
+    def __getattr__(self, name):
+        return getattr(self.client_factory(), name)
+
+    def collection(self, name):
+        return CapturingCollection(
+            self.archive, self.client_factory().collection(name), name
+        )
+
+
+class ArchiveCollection:
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+
+    def stream(self):
+        for doc_id, data in self.snapshots.items():
+            yield ArchiveSnapshot(doc_id, data)
+
+
+class ArchiveFirestore:
+    def __init__(self, archive):
+        self.archive = archive
+
+    def collection(self, name):
+        collections = self.archive.data['collections']
+        return ArchiveCollection(collections.get(name, {}))
+
+
+class Harness:
+    """
+    Installs the record or replay stand-ins for yfinance and firestore
+    """
+
+    def __init__(self, archive, client_factory=backend.firestore_client):
+        self.archive = archive
+        self.client_factory = client_factory
+        self.patched = {}
+        self.client = None
+        self.downloads = {}
+        self.lock = threading.Lock()
+
+    def download_key(self, args, kwargs):
+        """
+        Key of a yfinance download without start and end, a replay on
+        another day computes other dates. Repeated downloads of the same
+        tickers are numbered.
+        """
+        kwargs = {
+            name: value
+            for name, value in kwargs.items()
+            if name not in DATE_ARGS
+        }
+        key = _key('download', args, sorted(kwargs.items()))
+        with self.lock:
+            count = self.downloads.get(key, 0)
+            self.downloads[key] = count + 1
+        return _key(key, count)
+
+    def install(self):
+        archive = self.archive
+        ticker_cls = yfinance.Ticker
+        download = yfinance.download
+
+        def ticker(symbol, *args, **kwargs):
+            return TickerProxy(archive, ticker_cls, symbol, *args, **kwargs)
+
+        def record_download(*args, **kwargs):
+            key = self.download_key(args, kwargs)
+            if archive.recording:
+                return archive.record(key, download(*args, **kwargs))
+            return archive.lookup(key)
+
+        self.patched = {'Ticker': ticker_cls, 'download': download}
+        yfinance.Ticker = ticker
+        yfinance.download = record_download
+        if archive.recording:
+            self.client = CapturingClient(archive, self.client_factory)
+        else:
+            # recorded reads, writes stay in memory
+            self.client = RecordingClient(lambda: ArchiveFirestore(archive))
+            backend.offline = True
+        backend.use_client(self.client)
+
+    def uninstall(self, timings=None):
+        for name, value in self.patched.items():
+            setattr(yfinance, name, value)
+        backend.use_client(None)
+        backend.offline = False
+        if self.archive.recording:
+            if timings is not None:
+                self.archive.add_timings(timings)
+            self.archive.save()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import zlib
+
+from pyfirebasestockscli.storage import connect
+
+
+class FundamentalsScheduler:
+    """
+    Selects the symbols with stale fundamentals and spreads the refreshes
+    over several days
+    """
+
+    TABLE = 'fundamentals_refresh'
+
+    def __init__(self, db_path, max_age=90, spread_days=14, today=None):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.spread_days = max(min(spread_days, max_age), 1)
+        self.today = today or datetime.date.today()
+        with self._connect() as con:
+            con.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.TABLE} '
+                '(symbol TEXT PRIMARY KEY, refreshed TEXT NOT NULL)'
+            )
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def last_refresh(self, symbols):
+        with self._connect() as con:
+            rows = con.execute(
+                f'SELECT symbol, refreshed FROM {self.TABLE}'
+            ).fetchall()
+        symbols = set(symbols)
+        return {
+            sym: datetime.datetime.strptime(refreshed, '%Y-%m-%d').date()
+            for sym, refreshed in rows
+            if sym in symbols
+        }
+
+    def _max_age(self, symbol):
+        # a stable per symbol offset spreads the refreshes over several days
+        return self.max_age - zlib.crc32(symbol.encode()) % self.spread_days
+
+    def select(self, symbols):
+        """
+        Returns symbols without fundamentals or with outdated fundamentals
+        """
+        last = self.last_refresh(symbols)
+        due = []
+        for sym in symbols:
+            refreshed = last.get(sym)
+            if refreshed is None:
+                due.append(sym)
+            elif (self.today - refreshed).days >= self._max_age(sym):
+                due.append(sym)
+        return due
+
+    def mark(self, symbols):
+        today = self.today.isoformat()
+        with self._connect() as con:
+            con.executemany(
+                f'INSERT OR REPLACE INTO {self.TABLE} (symbol, refreshed) '
+                'VALUES (?, ?)',
+                [(sym, today) for sym in symbols],
+            )
+
+    def reset(self):
+        """
+        Forgets all refreshes, e.g. after the database was recreated
+        """
+        with self._connect() as con:
+            con.execute(f'DELETE FROM {self.TABLE}')
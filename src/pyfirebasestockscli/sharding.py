@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import math
+import zlib
+
+# document field with the id of the node which syncs the stock
+SHARD_FIELD = 'shard'
+# maximum number of values of an 'in' query
+IN_LIMIT = 10
+
+
+def chunk_slices(count, shards):
+    """
+    Splits count symbol groups into the contiguous chunks of the nodes
+    """
+    if count == 0:
+        return []
+    size = math.ceil(count / shards)
+    return [slice(start, start + size) for start in range(0, count, size)]
+
+
+def shard_query(collection, shard):
+    return collection.where(SHARD_FIELD, '==', shard)
+
+
+def stock_documents(store, shard=None):
+    """
+    Streams all stock documents or only the documents of one shard
+    """
+    stocks = store.collection('stocks')
+    if shard is not None:
+        stocks = shard_query(stocks, shard)
+    return stocks.stream()
+
+
+def documents_by_name(store, names):
+    """
+    Streams the stock documents in any shard with one of the given names
+    """
+    names = list(names)
+    stocks = store.collection('stocks')
+    for idx in range(0, len(names), IN_LIMIT):
+        query = stocks.where('name', 'in', names[idx : idx + IN_LIMIT])
+        yield from query.stream()
+
+
+def existing_names(store, names):
+    """
+    Returns the names of all stock documents in any shard with one of the
+    given names
+    """
+    return {doc.to_dict()['name'] for doc in documents_by_name(store, names)}
+
+
+class ShardMap:
+    """
+    Maps the symbols of the universe to the node which syncs them
+    """
+
+    def __init__(self, groups, shards):
+        self.shards = shards
+        self.symbols = {}
+        for shard, chunk in enumerate(chunk_slices(len(groups), shards)):
+            for syms in groups[chunk]:
+                for sym in syms:
+                    self.symbols.setdefault(sym, shard)
+
+    def shard_of(self, doc):
+        for sym in doc.get('symbols_eur', []) + doc.get('symbols_usd', []):
+            if sym in self.symbols:
+                return self.symbols[sym]
+        # stocks outside of the universe get a stable shard
+        return zlib.crc32(doc['name'].encode()) % self.shards
+
+    def moves(self, snapshots):
+        """
+        Returns (snapshot, update) of all documents with another shard
+        """
+        moves = []
+        for snapshot in snapshots:
+            doc_dict = snapshot.to_dict()
+            shard = self.shard_of(doc_dict)
+            if doc_dict.get(SHARD_FIELD) != shard:
+                moves.append((snapshot, {SHARD_FIELD: shard}))
+        return moves
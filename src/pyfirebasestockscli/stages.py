@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Stage:
+    """
+    A named step of a run. Outputs of cheap stages only live in memory,
+    they are recomputed whenever a selected stage needs them. All other
+    outputs are persisted and may come from an earlier run.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), cheap=False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.cheap = cheap
+
+
+class StageGraph:
+    def __init__(self, logger=None, profiler=None):
+        self.stages = []
+        self.logger = logger or logging.getLogger('firebase')
+        self.profiler = profiler
+        # seconds per finished stage
+        self.timings = {}
+
+    def add(self, name, func, inputs=(), outputs=(), cheap=False):
+        self.stages.append(Stage(name, func, inputs, outputs, cheap))
+
+    @property
+    def names(self):
+        return [stage.name for stage in self.stages]
+
+    def get(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise ValueError(
+            f'Unknown stage {name}, choose from {", ".join(self.names)}.'
+        )
+
+    def _producers(self, stage, stages):
+        return [
+            other
+            for other in stages
+            if other is not stage
+            and set(other.outputs) & set(stage.inputs)
+        ]
+
+    def requires(self, stage, resource):
+        """
+        True if stage produces or reads resource, also through the stages
+        it depends on
+        """
+        pending, seen = [stage], set()
+        while pending:
+            stage = pending.pop()
+            if resource in stage.inputs + stage.outputs:
+                return True
+            seen.add(stage.name)
+            pending += [
+                producer
+                for producer in self._producers(stage, self.stages)
+                if producer.name not in seen
+            ]
+        return False
+
+    def select(self, names, only=None, start=None):
+        """
+        Returns the stages of names limited to only or to all stages
+        from start on, plus the cheap stages they depend on
+        """
+        selected = [self.get(name) for name in names]
+        if only:
+            selected = [self.get(name) for name in only]
+        elif start:
+            first = self.get(start)
+            if first not in selected:
+                selected.append(first)
+            order = self.stages.index(first)
+            selected = [
+                stage
+                for stage in selected
+                if self.stages.index(stage) >= order
+            ]
+        pending = list(selected)
+        while pending:
+            stage = pending.pop()
+            for producer in self._producers(stage, self.stages):
+                if producer.cheap and producer not in selected:
+                    selected.append(producer)
+                    pending.append(producer)
+        return sorted(set(selected), key=self.stages.index)
+
+    def run(self, context, names, only=None, start=None, workers=1):
+        stages = self.select(names, only, start)
+        deps = {
+            stage.name: {
+                producer.name for producer in self._producers(stage, stages)
+            }
+            for stage in stages
+        }
+        done = set()
+        todo = list(stages)
+        if workers <= 1:
+            for stage in todo:
+                self._run_stage(stage, context)
+            return [stage.name for stage in stages]
+        running = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while todo or running:
+                for stage in list(todo):
+                    if deps[stage.name] <= done:
+                        todo.remove(stage)
+                        future = pool.submit(self._run_stage, stage, context)
+                        running[future] = stage
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    # raises the error of a failed stage
+                    future.result()
+                    done.add(stage.name)
+        return [stage.name for stage in stages]
+
+    def _run_stage(self, stage, context):
+        self.logger.info(f'Stage {stage.name}')
+        start = time.perf_counter()
+        if self.profiler is None:
+            outputs = stage.func(context)
+        else:
+            with self.profiler.profile(stage.name):
+                outputs = stage.func(context)
+        context.update(outputs or {})
+        self.timings[stage.name] = time.perf_counter() - start
+        self.logger.info(
+            f'Stage {stage.name} finished in '
+            f'{self.timings[stage.name]:.1f}s'
+        )
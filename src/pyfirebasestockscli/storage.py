@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    # negative values are KiB
+    ('cache_size', -65536),
+    ('mmap_size', 268435456),
+    ('temp_store', 'MEMORY'),
+    # filter workers wait for the write lock of each other
+    ('busy_timeout', 60000),
+)
+
+INDEXES = {
+    # covering index for the latest price and price by date lookups
+    'idx_price_symbol_date': ('Price', '(symbol, date, close)'),
+    'idx_symbol_name': ('Symbol', '(name)'),
+}
+
+_registered = False
+
+
+def default_db_path():
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.environ.get(
+        'STOCK2FIREBASE_DB', os.path.join(root_dir, 'full.sqlite')
+    )
+
+
+def apply_pragmas(con):
+    for name, value in PRAGMAS:
+        con.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def connect(db_path):
+    con = sqlite3.connect(db_path, timeout=60)
+    apply_pragmas(con)
+    try:
+        with con:
+            yield con
+    finally:
+        con.close()
+
+
+def register_profile():
+    """
+    Applies the pragmas to every connection pony opens
+    """
+    global _registered
+    if _registered:
+        return
+    from pystockdb.db.schema.stocks import db
+
+    @db.on_connect(provider='sqlite')
+    def _sqlite_profile(database, con):
+        apply_pragmas(con)
+
+    _registered = True
+
+
+def bind_database(db_args):
+    """
+    Binds the pony database once per process
+    """
+    from pony.orm import core
+    from pystockdb.db.schema.stocks import db
+
+    try:
+        db.bind(**db_args)
+    except core.BindingError:
+        pass
+    else:
+        db.generate_mapping(check_tables=False)
+
+
+def _tables(con):
+    rows = con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in rows}
+
+
+def has_table(db_path, table):
+    if not os.path.exists(db_path):
+        return False
+    with connect(db_path) as con:
+        return table in _tables(con)
+
+
+def create_indexes(db_path):
+    with connect(db_path) as con:
+        tables = _tables(con)
+        for name, (table, columns) in INDEXES.items():
+            if table in tables:
+                con.execute(
+                    f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" {columns}'
+                )
+        con.execute('ANALYZE')
+
+
+def drop_indexes(db_path):
+    with connect(db_path) as con:
+        for name in INDEXES:
+            con.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+@contextmanager
+def bulk_load(db_path):
+    """
+    Drops the extra indexes during bulk inserts and rebuilds them afterwards
+    """
+    drop_indexes(db_path)
+    try:
+        yield
+    finally:
+        create_indexes(db_path)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import itertools
+import json
+import logging
+import os
+
+import pkg_resources
+
+CACHE_FORMAT = 1
+
+
+def package_version(name):
+    try:
+        return pkg_resources.get_distribution(name).version
+    except pkg_resources.DistributionNotFound:
+        return None
+
+
+class UniverseCache:
+    """
+    Stores the de-duplicated symbol groups of all indices in a json file
+    which is rebuilt if the indices or the pytickersymbols version change
+    """
+
+    def __init__(self, path, logger=None):
+        self.path = path
+        self.logger = logger or logging.getLogger('firebase')
+
+    def _key(self, indices):
+        return {
+            'format': CACHE_FORMAT,
+            'version': package_version('pytickersymbols'),
+            'indices': sorted(indices),
+        }
+
+    def _read(self, key):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('key') != key:
+            self.logger.info('Universe cache is outdated.')
+            return None
+        return data
+
+    def _write(self, data):
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        # atomic for concurrent shard processes
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def build_universe(indices, stock_data):
+        index_symbols = []
+        stocks = []
+        for index in indices:
+            stocks = stocks + stock_data.get_yahoo_ticker_symbols_by_index(
+                index
+            )
+            # we also need index data for levermann filter
+            index_symbols.append(stock_data.index_to_yahoo_symbol(index))
+
+        # removes duplicate values
+        stocks.sort()
+        groups = list(stocks for stocks, _ in itertools.groupby(stocks))
+        fra_groups = [
+            [sym for sym in syms if sym.endswith('.F')] for syms in groups
+        ]
+        return {
+            'groups': groups,
+            'fra_groups': fra_groups,
+            'index_symbols': index_symbols,
+        }
+
+    def load(self, indices, stock_data):
+        key = self._key(indices)
+        data = self._read(key)
+        if data is None:
+            data = self.build_universe(indices, stock_data)
+            data['key'] = key
+            try:
+                self._write(data)
+            except OSError as err:
+                self.logger.warning(
+                    f"Couldn't write universe cache {self.path}: {err}"
+                )
+        return data
@@ -241,7 +241,7 @@ class TestCLI(unittest.TestCase):
     )
     @monkey_func(
         target='pyfirebasestockscli.create_job',
-        func=lambda x, y: (['ADS.F', 'ADDDF'], ['ADS.F'], ['^GDAXI']),
+        func=lambda x, y, **kwargs: (['ADS.F', 'ADDDF'], ['ADS.F'], ['^GDAXI']),
     )
     def test_7_updates(self):
         self.assertEqual(pyfirebasestockscli.app(['-u']), 0)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+import yfinance  # noqa: E402
+
+from pyfirebasestockscli.dividends import DividendYields, ex_days  # noqa: E402
+from pyfirebasestockscli.dividends import fetch_dividends  # noqa: E402
+from pyfirebasestockscli.prices import PriceStore  # noqa: E402
+
+
+class FakeDividends:
+    def __init__(self, dividends):
+        self.index = [date for date, _ in dividends]
+        self.values = [amount for _, amount in dividends]
+
+
+class TestDividendYields(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.root.name, 'full.sqlite')
+        con = sqlite3.connect(self.db_path)
+        con.execute('CREATE TABLE "Symbol" (id INTEGER PRIMARY KEY, name TEXT)')
+        con.execute(
+            'CREATE TABLE "Price" (id INTEGER PRIMARY KEY, symbol INTEGER, '
+            'date DATETIME, close REAL)'
+        )
+        con.execute('INSERT INTO "Symbol" VALUES (1, \'ADS.F\')')
+        con.executemany(
+            'INSERT INTO "Price" (symbol, date, close) VALUES (1, ?, ?)',
+            [(f'2021-0{month}-01 00:00:00', 100.0) for month in range(1, 7)],
+        )
+        con.commit()
+        con.close()
+        store = PriceStore(os.path.join(self.root.name, 'prices'), self.db_path)
+        store.refresh(['ADS.F'])
+        self.table = DividendYields(self.db_path, store)
+        self.table.refresh(
+            {
+                'ADS.F': FakeDividends(
+                    [
+                        (datetime.datetime(2021, 1, 1), 2.0),
+                        (datetime.datetime(2021, 2, 1), 4.0),
+                        # no price at the ex-date
+                        (datetime.datetime(2021, 2, 15), 3.0),
+                        (datetime.datetime(2021, 3, 1), 20.0),
+                        (datetime.datetime(2021, 4, 1), 6.0),
+                    ]
+                )
+            }
+        )
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_rows(self):
+        con = sqlite3.connect(self.db_path)
+        rows = con.execute('SELECT * FROM dividend_yield').fetchall()
+        con.close()
+        self.assertEqual(
+            rows,
+            [
+                ('ADS.F', '2021-01-01', 2.0, 100.0, 2.0, 1),
+                ('ADS.F', '2021-02-01', 4.0, 100.0, 4.0, 1),
+                ('ADS.F', '2021-02-15', 3.0, None, None, 0),
+                ('ADS.F', '2021-03-01', 20.0, 100.0, 20.0, 0),
+                ('ADS.F', '2021-04-01', 6.0, 100.0, 6.0, 1),
+            ],
+        )
+
+    def test_aggregates(self):
+        dates, values = self.table.yields('ADS.F', since='2021-02-01')
+        self.assertEqual(dates, ['2021-02-01', '2021-04-01'])
+        self.assertEqual(list(values), [4.0, 6.0])
+        self.assertEqual(self.table.median('ADS.F'), 4.0)
+        self.assertEqual(
+            self.table.median('ADS.F', since=datetime.date(2021, 2, 1)), 5.0
+        )
+        self.assertEqual(self.table.median('ADS.F', max_yield=25), 5.0)
+        # dividends without plausible yield
+        self.assertTrue(
+            math.isnan(self.table.median('ADS.F', '2021-02-02', max_yield=5))
+        )
+        # no dividends since the date
+        self.assertTrue(math.isnan(self.table.median('ADS.F', '2021-05-01')))
+        self.assertEqual(
+            self.table.medians(['ADS.F', 'BMW.F']),
+            {'ADS.F': 4.0, 'BMW.F': None},
+        )
+
+    def test_no_dividends(self):
+        self.table.refresh({'BMW.F': FakeDividends([])})
+        self.assertEqual(
+            self.table.fetched(['ADS.F', 'BMW.F', 'SAP.F']), {'ADS.F', 'BMW.F'}
+        )
+        # loaded without dividends is not loaded again
+        self.assertTrue(math.isnan(self.table.median('BMW.F')))
+        self.assertIsNone(self.table.median('SAP.F'))
+
+    def test_refresh_replaces(self):
+        self.table.update('ADS.F', ex_days([datetime.date(2021, 5, 1)]), [1.0])
+        self.assertEqual(self.table.median('ADS.F'), 1.0)
+
+
+class FakeTicker:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    @property
+    def dividends(self):
+        if self.symbol == 'BAD.F':
+            raise KeyError('Date')
+        return [self.symbol]
+
+
+class TestFetchDividends(unittest.TestCase):
+    def setUp(self):
+        self.ticker = yfinance.Ticker
+        yfinance.Ticker = FakeTicker
+
+    def tearDown(self):
+        yfinance.Ticker = self.ticker
+
+    def test_errors(self):
+        with self.assertLogs('firebase', 'ERROR') as logs:
+            dividends = fetch_dividends(['ADS.F', 'BAD.F', 'SAP.F'], 2)
+        self.assertEqual(dividends, {'ADS.F': ['ADS.F'], 'SAP.F': ['SAP.F']})
+        self.assertIn('BAD.F', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.dryrun import (  # noqa: E402
+    LatencyLog,
+    RecordingClient,
+    document_size,
+)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+class FakeClient:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        return self
+
+    def stream(self):
+        return iter(self.docs)
+
+
+class TestDryRun(unittest.TestCase):
+    def setUp(self):
+        docs = [
+            FakeSnapshot(str(idx), {'name': f'stock {idx}', 'price': idx})
+            for idx in range(120)
+        ]
+        self.client = RecordingClient(lambda: FakeClient(docs), diff=True)
+
+    def test_delete_collection(self):
+        ref = self.client.collection('stocks')
+        deleted = 0
+        while True:
+            docs = list(ref.limit(50).stream())
+            for doc in docs:
+                doc.reference.delete()
+                deleted += 1
+            if len(docs) < 50:
+                break
+        self.assertEqual(deleted, 120)
+        self.assertEqual(list(ref.stream()), [])
+        plan = self.client.plan.summary()
+        self.assertEqual(plan['deletes'], 120)
+        self.assertEqual(plan['collections']['stocks']['reads'], 120)
+
+    def test_writes(self):
+        docs = list(self.client.collection('stocks').stream())
+        batch = self.client.batch()
+        batch.set(docs[0].reference, {'price': 0}, merge=True)
+        batch.set(docs[1].reference, {'price': 5}, merge=True)
+        batch.commit()
+        batch.set(self.client.collection('stocks').document(), {'name': 'x'})
+        batch.commit()
+        stats = self.client.plan.summary()['collections']['stocks']
+        self.assertEqual(stats['updates'], 2)
+        self.assertEqual(stats['writes'], 1)
+        self.assertEqual(stats['unchanged'], 1)
+        self.assertEqual(stats['changed'], 1)
+        self.assertEqual(stats['added'], 1)
+        # recorded writes are visible to later reads
+        self.assertEqual(len(list(self.client.collection('stocks').stream())), 121)
+        self.assertEqual(docs[1].reference.current['price'], 5)
+
+    def test_estimate(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'latency.json')
+            LatencyLog(path).save([(1, 0.2), (401, 1.0), (201, 0.6)])
+            latencies = LatencyLog(path)
+            self.assertAlmostEqual(latencies.estimate([101, 301]), 1.2)
+
+    def test_document_size(self):
+        # 'stocks/1' + 16 + {'a': 'bc'} + 32
+        self.assertEqual(document_size('stocks/1', {'a': 'bc'}), 9 + 16 + 5 + 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.export import ColumnarExport  # noqa: E402
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestColumnarExport(unittest.TestCase):
+    def _payload(self, idx):
+        return {
+            'date': '01/02/2021',
+            'last_price_eur': {'ADS.F': 10.0 + idx},
+            'last_price_usd': {'ADDDF': None},
+            'RsiP14_value': 42.0,
+            'RsiP14_status': 1,
+        }
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as root:
+            export = ColumnarExport(
+                root, 'parquet', batch_size=2, date=datetime.date(2021, 1, 2)
+            )
+            for idx in range(5):
+                export.add(f'stock {idx}', self._payload(idx))
+            path = export.close()
+            self.assertEqual(
+                path, os.path.join(root, 'date=2021-01-02', 'stocks-0.parquet')
+            )
+            table = pq.read_table(path)
+            self.assertEqual(table.num_rows, 5)
+            self.assertIn('RsiP14_value', table.column_names)
+            self.assertIn('RsiP14_status', table.column_names)
+
+    def test_new_columns(self):
+        import pyarrow.parquet as pq
+
+        with tempfile.TemporaryDirectory() as root:
+            export = ColumnarExport(root, 'parquet', batch_size=2)
+            for idx in range(4):
+                payload = self._payload(idx)
+                if idx == 3:
+                    # first filter result in the second batch
+                    payload['Levermann_value'] = 7.0
+                    payload['Levermann_status'] = 2
+                export.add(f'stock {idx}', payload)
+            path = export.close()
+            table = pq.read_table(path)
+            self.assertEqual(
+                table.column('Levermann_value').to_pylist(),
+                [None, None, None, 7.0],
+            )
+            self.assertEqual(
+                table.column('Levermann_status').to_pylist(),
+                [None, None, None, 2],
+            )
+            self.assertEqual(table.column('RsiP14_value').null_count, 0)
+            # part files are removed
+            self.assertEqual(
+                os.listdir(os.path.dirname(path)), [os.path.basename(path)]
+            )
+
+    def test_arrow(self):
+        with tempfile.TemporaryDirectory() as root:
+            export = ColumnarExport(root, 'arrow', batch_size=2)
+            export.add('stock', self._payload(0))
+            path = export.close()
+            with pyarrow.memory_map(path) as source:
+                table = pyarrow.ipc.open_file(source).read_all()
+            self.assertEqual(table.column('name').to_pylist(), ['stock'])
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, ColumnarExport, '.', 'csv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.backend import use_client  # noqa: E402
+from pyfirebasestockscli.dryrun import RecordingClient  # noqa: E402
+from pyfirebasestockscli.live import LivePricePush  # noqa: E402
+
+
+class TestLivePricePush(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.root.name, 'full.sqlite')
+        con = sqlite3.connect(self.db_path)
+        con.execute('CREATE TABLE "Symbol" (id INTEGER PRIMARY KEY, name TEXT)')
+        con.execute(
+            'CREATE TABLE "Price" (id INTEGER PRIMARY KEY, symbol INTEGER, '
+            'date DATETIME, close REAL)'
+        )
+        con.executemany(
+            'INSERT INTO "Symbol" VALUES (?, ?)', [(1, 'ADS.F'), (2, 'ADDDF')]
+        )
+        con.commit()
+        con.close()
+        self.insert([(1, '2021-01-01 00:00:00', 1.0)])
+        # in-memory firestore
+        self.store = RecordingClient()
+        batch = self.store.batch()
+        batch.set(
+            self.store.collection('stocks').document('adidas'),
+            {
+                'name': 'adidas AG',
+                'symbols_eur': ['ADS.F', 'ADS.DE'],
+                'symbols_usd': ['ADDDF'],
+                'last_price_eur': {'ADS.F': 1.0, 'ADS.DE': 1.5},
+                'last_price_usd': {'ADDDF': None},
+            },
+        )
+        batch.commit()
+        use_client(self.store)
+
+    def tearDown(self):
+        use_client(None)
+        self.root.cleanup()
+
+    def insert(self, rows):
+        con = sqlite3.connect(self.db_path)
+        con.executemany(
+            'INSERT INTO "Price" (symbol, date, close) VALUES (?, ?, ?)', rows
+        )
+        con.commit()
+        con.close()
+
+    def test_push(self):
+        live = LivePricePush(self.db_path, logging.getLogger(), window=0)
+        # the first poll starts at the current end of the table
+        self.assertEqual(live.poll(), 0)
+        self.assertFalse(live.due())
+        self.insert(
+            [
+                (1, '2021-01-02 00:00:00', 2.0),
+                (1, '2021-01-03 00:00:00', 3.0),
+                (2, '2021-01-03 00:00:00', 4.0),
+            ]
+        )
+        self.assertEqual(live.poll(), 3)
+        self.assertTrue(live.due())
+        self.assertEqual(live.flush(), 2)
+        # both prices are merged into one write of the adidas document
+        stats = self.store.plan.summary()['collections']['stocks']
+        self.assertEqual(stats['updates'], 1)
+        doc = next(self.store.collection('stocks').stream()).to_dict()
+        self.assertEqual(doc['last_price_eur'], {'ADS.F': 3.0, 'ADS.DE': 1.5})
+        self.assertEqual(doc['last_price_usd'], {'ADDDF': 4.0})
+        # unchanged prices are not pushed again
+        self.insert([(1, '2021-01-03 00:00:00', 3.0)])
+        live.poll()
+        self.assertEqual(live.flush(), 0)
+        self.assertEqual(self.store.plan.summary()['batches'], 2)
+
+    def test_rebuild(self):
+        live = LivePricePush(self.db_path, logging.getLogger(), window=0)
+        self.insert([(1, '2021-01-02 00:00:00', 2.0)])
+        live.poll()
+        self.assertEqual(live.poll(), 0)
+        # a new database drops and fills the price table again
+        con = sqlite3.connect(self.db_path)
+        con.execute('DROP TABLE "Price"')
+        con.commit()
+        con.close()
+        self.assertEqual(live.poll(), 0)
+        con = sqlite3.connect(self.db_path)
+        con.execute(
+            'CREATE TABLE "Price" (id INTEGER PRIMARY KEY, symbol INTEGER, '
+            'date DATETIME, close REAL)'
+        )
+        con.commit()
+        con.close()
+        # the new ids reach the old cursor again
+        self.insert(
+            [(1, '2021-01-03 00:00:00', 4.0), (1, '2021-01-04 00:00:00', 5.0)]
+        )
+        self.assertEqual(live.poll(), 2)
+        self.assertEqual(live.flush(), 1)
+        doc = next(self.store.collection('stocks').stream()).to_dict()
+        self.assertEqual(doc['last_price_eur']['ADS.F'], 5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pony.orm import core, db_session  # noqa: E402
+from pystockdb.db.schema.stocks import (  # noqa: E402
+    Argument,
+    Item,
+    PriceItem,
+    Result,
+    Signal,
+    Symbol,
+    Tag,
+    Type,
+    db,
+)
+
+from pyfirebasestockscli import SyncFirebaseDB  # noqa: E402
+from pyfirebasestockscli.memo import FilterCache  # noqa: E402
+from pyfirebasestockscli.memo import prune_signals  # noqa: E402
+from pyfirebasestockscli.memo import signal_symbols  # noqa: E402
+
+ARGS = {'lookback': 2}
+
+
+class TestFilterCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.root.name, 'full.sqlite')
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_stale(self):
+        cache = FilterCache(self.db_path)
+        versions = {'ADS.F': ('2021-01-01', None), 'BMW.F': ('2021-01-01', None)}
+        self.assertEqual(
+            cache.stale('DividendKings', ARGS, versions), ['ADS.F', 'BMW.F']
+        )
+        cache.store('DividendKings', ARGS, versions, ['ADS.F', 'BMW.F'])
+        versions['BMW.F'] = ('2021-01-02', None)
+        self.assertEqual(cache.stale('DividendKings', ARGS, versions), ['BMW.F'])
+        # other arguments and filters are separate entries
+        self.assertEqual(
+            len(cache.stale('DividendKings', {'lookback': 3}, versions)), 2
+        )
+        self.assertEqual(len(cache.stale('Rsi', ARGS, versions)), 2)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 7)
+
+    def test_ttl(self):
+        cache = FilterCache(self.db_path, ttl=0)
+        versions = {'ADS.F': ('2021-01-01', None)}
+        cache.store('DividendKings', ARGS, versions, ['ADS.F'])
+        self.assertEqual(
+            cache.stale('DividendKings', ARGS, versions), ['ADS.F']
+        )
+
+    def test_lru(self):
+        cache = FilterCache(self.db_path, max_entries=2)
+        versions = {
+            sym: ('2021-01-01', None) for sym in ['A.F', 'B.F', 'C.F']
+        }
+        for sym in versions:
+            cache.store('DividendKings', ARGS, versions, [sym])
+        self.assertEqual(cache.stale('DividendKings', ARGS, versions), ['A.F'])
+
+    def test_clear(self):
+        cache = FilterCache(self.db_path)
+        versions = {'ADS.F': ('2021-01-01', None)}
+        cache.store('DividendKings', ARGS, versions, ['ADS.F'])
+        cache.clear()
+        self.assertEqual(
+            cache.stale('DividendKings', ARGS, versions), ['ADS.F']
+        )
+
+
+class TestSignalSymbols(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            db.bind(provider='sqlite', filename=':memory:')
+        except core.BindingError:
+            pass
+        else:
+            db.generate_mapping(create_tables=True)
+
+    def setUp(self):
+        db.drop_all_tables(with_all_data=True)
+        db.create_tables()
+        self.now = datetime.datetime(2021, 1, 2)
+        with db_session:
+            fil = Type(name=Type.FIL)
+            for name in ['ADS.F', 'BMW.F', 'SAP.F']:
+                Symbol(
+                    name=name, price_item=PriceItem(item=Item()), item=Item()
+                )
+            for name in ['RsiP5', 'AdxP5']:
+                Tag(name=name, type=fil)
+
+    @db_session
+    def signal(self, symbol, name, date, value=1):
+        item = Item()
+        item.tags.add(Tag.get(name=name))
+        result = Result(value=value, status=0, date=date)
+        Argument(item=Item(), arg='14', result=result)
+        sig = Signal(item=item, result=result)
+        sig.price_items.add(Symbol.get(name=symbol).price_item)
+
+    def test_signal_symbols(self):
+        old = self.now - datetime.timedelta(days=1)
+        self.signal('ADS.F', 'RsiP5', self.now)
+        self.signal('ADS.F', 'AdxP5', self.now)
+        # one filter raised
+        self.signal('BMW.F', 'RsiP5', self.now)
+        # signals of an older run
+        self.signal('SAP.F', 'RsiP5', old)
+        self.signal('SAP.F', 'AdxP5', old)
+        symbols = ['ADS.F', 'BMW.F', 'SAP.F']
+        self.assertEqual(
+            signal_symbols(symbols, ['RsiP5', 'AdxP5'], self.now), ['ADS.F']
+        )
+        self.assertEqual(
+            signal_symbols(symbols, ['RsiP5'], self.now), ['ADS.F', 'BMW.F']
+        )
+        self.assertEqual(signal_symbols(symbols, ['RsiP5'], old), symbols)
+
+    def test_prune_signals(self):
+        # three runs, the newest signals come first
+        for run in range(3):
+            date = self.now + datetime.timedelta(days=run)
+            self.signal('ADS.F', 'RsiP5', date, value=run)
+            self.signal('ADS.F', 'AdxP5', date, value=run)
+        self.signal('BMW.F', 'RsiP5', self.now)
+        with db_session:
+            stock = Symbol.get(name='ADS.F')
+            self.assertEqual(
+                sorted(list(SyncFirebaseDB._signals(stock))[:2]),
+                [('AdxP5', 2, 0), ('RsiP5', 2, 0)],
+            )
+            items = Item.select().count()
+        self.assertEqual(prune_signals(['ADS.F', 'BMW.F']), 4)
+        with db_session:
+            stock = Symbol.get(name='ADS.F')
+            self.assertEqual(
+                sorted(SyncFirebaseDB._signals(stock)),
+                [('AdxP5', 2, 0), ('RsiP5', 2, 0)],
+            )
+            self.assertEqual(Signal.select().count(), 3)
+            self.assertEqual(Result.select().count(), 3)
+            self.assertEqual(Argument.select().count(), 3)
+            # items of the signals and their arguments
+            self.assertEqual(Item.select().count(), items - 8)
+        self.assertEqual(prune_signals(['ADS.F', 'BMW.F']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
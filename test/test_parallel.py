@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import sys
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.parallel import build_each  # noqa: E402
+from pyfirebasestockscli.parallel import chunk_symbols  # noqa: E402
+
+
+class FakeBuilder:
+    def __init__(self, filters):
+        self.filters = filters
+        self.symbols = None
+        self.builds = []
+
+    def set_filters(self, filters):
+        self.filters = filters
+
+    def build(self):
+        self.builds.append((self.symbols, self.filters))
+
+
+class TestParallel(unittest.TestCase):
+    def test_chunk_symbols(self):
+        self.assertEqual(
+            chunk_symbols(['A', 'B', 'C'], 2), [['A', 'C'], ['B']]
+        )
+        self.assertEqual(chunk_symbols(['A'], 4), [['A']])
+
+    def test_build_each(self):
+        builder = FakeBuilder(['RsiP5', 'AdxP5'])
+        build_each(builder, ['ADS.F', 'BMW.F'])
+        # one short session per symbol and filter
+        self.assertEqual(
+            builder.builds,
+            [
+                (['ADS.F'], ['RsiP5']),
+                (['ADS.F'], ['AdxP5']),
+                (['BMW.F'], ['RsiP5']),
+                (['BMW.F'], ['AdxP5']),
+            ],
+        )
+        self.assertEqual(builder.filters, ['RsiP5', 'AdxP5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import sys
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.payload import PayloadBuilder, StockDoc  # noqa: E402
+
+
+class TestPayloadBuilder(unittest.TestCase):
+    def test_build(self):
+        warnings = []
+        prices = {'ADS.F': 200.0}
+        builder = PayloadBuilder(
+            prices.get,
+            lambda sym, name: warnings.append((sym, name)),
+            date='01/02/2021',
+        )
+        doc = StockDoc('ref', ['ADS.F'], ['ADDDF'])
+        signals = [('RsiP14', 42.0, 1), ('RsiP14', 0.0, -1), ('AdxP5', 3, 0)]
+        stock = builder.build('adidas AG', iter(signals), doc)
+        self.assertEqual(
+            stock,
+            {
+                'date': '01/02/2021',
+                'last_price_eur': {'ADS.F': 200.0},
+                'last_price_usd': {'ADDDF': None},
+                'RsiP14_value': 42.0,
+                'RsiP14_status': 1,
+                'AdxP5_value': 3,
+                'AdxP5_status': 0,
+            },
+        )
+        self.assertEqual(warnings, [('ADDDF', 'adidas AG')])
+
+    def test_interned_keys(self):
+        builder = PayloadBuilder(lambda sym: None)
+        doc = StockDoc('ref', [], [])
+        first = builder.build('a', [('RsiP14', 1, 1)], doc)
+        second = builder.build('b', [('RsiP14', 2, 1)], doc)
+        first_key = next(key for key in first if key == 'RsiP14_value')
+        second_key = next(key for key in second if key == 'RsiP14_value')
+        self.assertIs(first_key, second_key)
+        self.assertIs(first['date'], second['date'])
+
+
+if __name__ == '__main__':
+    unittest.main()
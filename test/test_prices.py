@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.prices import PriceStore  # noqa: E402
+
+
+class TestPriceStore(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.root.name, 'full.sqlite')
+        con = sqlite3.connect(self.db_path)
+        con.execute('CREATE TABLE "Symbol" (id INTEGER PRIMARY KEY, name TEXT)')
+        con.execute(
+            'CREATE TABLE "Price" (id INTEGER PRIMARY KEY, symbol INTEGER, '
+            'date DATETIME, close REAL)'
+        )
+        con.execute('INSERT INTO "Symbol" VALUES (1, \'ADS.F\')')
+        con.commit()
+        con.close()
+        self.add_prices(1, 10)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def add_prices(self, first, last):
+        con = sqlite3.connect(self.db_path)
+        con.executemany(
+            'INSERT INTO "Price" (symbol, date, close) VALUES (1, ?, ?)',
+            [
+                (f'2021-01-{day:02d} 00:00:00', float(day))
+                for day in range(first, last + 1)
+            ],
+        )
+        con.commit()
+        con.close()
+
+    def test_lookups(self):
+        store = PriceStore(os.path.join(self.root.name, 'prices'), self.db_path)
+        self.assertIsNone(store.latest('ADS.F'))
+        store.refresh(['ADS.F', 'BMW.F'])
+        self.assertEqual(store.latest('ADS.F'), 10.0)
+        self.assertIsNone(store.latest('BMW.F'))
+        self.assertEqual(
+            store.close_at('ADS.F', datetime.datetime(2021, 1, 5, 12)), 5.0
+        )
+        self.assertIsNone(store.close_at('ADS.F', datetime.date(2021, 1, 11)))
+
+    def test_missing(self):
+        store = PriceStore(os.path.join(self.root.name, 'prices'), self.db_path)
+        self.assertEqual(store.missing(['ADS.F', 'BMW.F']), ['BMW.F'])
+
+    def test_incremental_refresh(self):
+        root = os.path.join(self.root.name, 'prices')
+        PriceStore(root, self.db_path).refresh(['ADS.F'])
+        self.add_prices(11, 12)
+        store = PriceStore(root, self.db_path)
+        store.refresh(['ADS.F'])
+        self.assertEqual(store.latest('ADS.F'), 12.0)
+        days, closes = store._load('ADS.F')
+        self.assertEqual(len(days), 12)
+        self.assertEqual(list(closes), [float(day) for day in range(1, 13)])
+
+
+    def test_clear(self):
+        root = os.path.join(self.root.name, 'prices')
+        store = PriceStore(root, self.db_path)
+        store.refresh(['ADS.F'])
+        self.assertEqual(store.latest('ADS.F'), 10.0)
+        store.clear()
+        self.assertEqual(os.listdir(root), [])
+        self.assertIsNone(store.latest('ADS.F'))
+        # a recreated database with older prices
+        con = sqlite3.connect(self.db_path)
+        con.execute('DELETE FROM "Price"')
+        con.commit()
+        con.close()
+        self.add_prices(1, 3)
+        store.refresh(['ADS.F'])
+        self.assertEqual(store.latest('ADS.F'), 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
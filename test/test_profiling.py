@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import os
+import pstats
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.profiling import StageProfiler  # noqa: E402
+from pyfirebasestockscli.stages import StageGraph  # noqa: E402
+
+
+def busy_stage(context):
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        pass
+
+
+class TestStageProfiler(unittest.TestCase):
+    def test_sample(self):
+        with tempfile.TemporaryDirectory() as root:
+            graph = StageGraph(profiler=StageProfiler(root, interval=0.001))
+            graph.add('prices', busy_stage)
+            graph.run({}, ['prices'])
+            with open(os.path.join(root, 'prices.collapsed')) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines)
+            self.assertTrue(all(line.startswith('prices;') for line in lines))
+            self.assertTrue(any('busy_stage' in line for line in lines))
+            # the pony query statistics without the total entry
+            with open(os.path.join(root, 'prices.sql.tsv')) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines[0].startswith('count\t'))
+            self.assertTrue(all(not line.endswith('\tNone') for line in lines))
+
+    def test_cprofile(self):
+        with tempfile.TemporaryDirectory() as root:
+            graph = StageGraph(profiler=StageProfiler(root, 'cprofile'))
+            graph.add('sync', busy_stage)
+            graph.run({}, ['sync'])
+            stats = pstats.Stats(os.path.join(root, 'sync.prof'))
+            self.assertTrue(
+                any(func[2] == 'busy_stage' for func in stats.stats)
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
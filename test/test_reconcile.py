@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import copy
+import logging
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, 'src')
+
+from pony.orm import db_session, select  # noqa: E402
+from pystockdb.db.schema.stocks import Index, Stock  # noqa: E402
+from pystockdb.tools.create import CreateAndFillDataBase  # noqa: E402
+
+from pyfirebasestockscli import SyncIndexStocks  # noqa: E402
+from pyfirebasestockscli.reconcile import Reconciliation  # noqa: E402
+
+CONFIG = {
+    'indices': ['DAX'],
+    'currencies': ['EUR', 'USD'],
+    'prices': False,
+    'create': True,
+    'max_history': 1,
+    'db_args': {'provider': 'sqlite', 'filename': ':memory:'},
+}
+
+
+def fields(name, symbols_eur, indices=('DAX',)):
+    return {
+        'name': name,
+        'symbols_eur': list(symbols_eur),
+        'symbols_usd': [],
+        'country': 'Germany',
+        'tags': ['Industrials'],
+        'indices': list(indices),
+    }
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+class TestReconciliation(unittest.TestCase):
+    def test_compute(self):
+        snapshots = [
+            FakeSnapshot(fields('adidas', ['ADS.F'])),
+            FakeSnapshot(fields('BMW', ['BMW.F'])),
+            FakeSnapshot(fields('BMW', ['BMW.F'])),
+            FakeSnapshot(fields('Wirecard', ['WDI.F'])),
+            FakeSnapshot(fields('Airbus', ['AIR.F'], ['DAX', 'MDAX'])),
+        ]
+        local_docs = {
+            'adidas': fields('adidas', ['ADS.F']),
+            'BMW': fields('BMW', ['BMW.F', 'BMW.DE']),
+            'Siemens': fields('Siemens', ['SIE.F']),
+            # other index order is not a change
+            'Airbus': fields('Airbus', ['AIR.F'], ['MDAX', 'DAX']),
+        }
+        result = Reconciliation.compute(
+            local_docs,
+            snapshots,
+            set(local_docs) | {'Bayer'},
+        )
+        self.assertEqual(result.added, ['Siemens'])
+        self.assertEqual([name for name, _ in result.changed], ['BMW'])
+        self.assertIs(result.changed[0][1], snapshots[1])
+        # duplicate document and delisted stock
+        self.assertEqual(result.removed, [snapshots[2], snapshots[3]])
+        self.assertTrue(result)
+
+    def test_empty(self):
+        snapshots = [FakeSnapshot(fields('adidas', ['ADS.F']))]
+        result = Reconciliation.compute(
+            {'adidas': fields('adidas', ['ADS.F'])}, snapshots, {'adidas'}
+        )
+        self.assertFalse(result)
+
+
+class TestSyncIndexStocks(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('test')
+        CreateAndFillDataBase(copy.deepcopy(CONFIG), self.logger).build()
+
+    @db_session
+    def members(self):
+        return set(select(stock.name for stock in Index.get(name='DAX').stocks))
+
+    def test_sync_members(self):
+        config = dict(copy.deepcopy(CONFIG), create=False)
+        sync = SyncIndexStocks(config, self.logger)
+        stocks = list(sync.ticker_symbols.get_stocks_by_index('DAX'))
+        left, joined = stocks[0], copy.deepcopy(stocks[1])
+        joined['name'] = 'New Member AG'
+        joined['symbol'] = 'NEW'
+        for symbol in joined['symbols']:
+            symbol['yahoo'] = 'NEW' + symbol['yahoo']
+            symbol['google'] = 'NEW' + symbol['google']
+        before = self.members()
+        with mock.patch.object(
+            sync.ticker_symbols,
+            'get_stocks_by_index',
+            return_value=stocks[1:] + [joined],
+        ):
+            self.assertEqual(sync.build(), (1, 1))
+            self.assertEqual(sync.sync_members(), (0, 0))
+        self.assertEqual(
+            self.members(), before - {left['name']} | {'New Member AG'}
+        )
+        with db_session:
+            # the delisted stock keeps its data
+            self.assertFalse(Stock.get(name=left['name']).indexs)
+            self.assertEqual(Index.select().count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
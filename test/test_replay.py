@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+import yfinance  # noqa: E402
+
+from pyfirebasestockscli import backend  # noqa: E402
+from pyfirebasestockscli.dryrun import RecordingClient  # noqa: E402
+from pyfirebasestockscli.replay import Archive, Harness  # noqa: E402
+
+
+class FakeTicker:
+    calls = 0
+
+    def __init__(self, symbol):
+        FakeTicker.calls += 1
+        self.dividends = {'2020-01-01': 1.0}
+        self.symbol = symbol
+
+    def history(self, period='1mo'):
+        return [self.symbol, period]
+
+
+def fake_download(tickers, start=None, end=None, **kwargs):
+    return [tickers, start, end]
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.root.name, 'run.pkl.xz')
+        self.ticker = yfinance.Ticker
+        self.yf_download = yfinance.download
+        yfinance.Ticker = FakeTicker
+        yfinance.download = fake_download
+        FakeTicker.calls = 0
+        # stands in for firestore while recording
+        self.store = RecordingClient()
+        doc = self.store.collection('stocks').document('a')
+        self.store.apply(doc, {'name': 'Adidas'}, False)
+        backend.use_client(None)
+
+    def tearDown(self):
+        yfinance.Ticker = self.ticker
+        yfinance.download = self.yf_download
+        backend.use_client(None)
+        self.root.cleanup()
+
+    def record(self):
+        harness = Harness(Archive(self.path, 'record'), lambda: self.store)
+        harness.install()
+        ticker = yfinance.Ticker('ADS.F')
+        dividends = ticker.dividends
+        history = ticker.history(period='1y')
+        stocks = backend.get_client().collection('stocks')
+        list(stocks.where('name', '==', 'Adidas').stream())
+        harness.uninstall({'sync': 2.0})
+        return dividends, history
+
+    def test_replay(self):
+        dividends, history = self.record()
+        self.assertEqual(FakeTicker.calls, 1)
+        harness = Harness(Archive(self.path, 'replay'))
+        harness.install()
+        try:
+            self.assertTrue(backend.offline)
+            self.assertIsNone(backend.init_app('url', 'missing.json'))
+            ticker = yfinance.Ticker('ADS.F')
+            self.assertEqual(ticker.dividends, dividends)
+            self.assertEqual(ticker.history(period='1y'), history)
+            with self.assertRaises(RuntimeError):
+                ticker.history(period='5y')
+            with self.assertRaises(RuntimeError):
+                yfinance.Ticker('SAP.F').dividends
+            docs = list(backend.get_client().collection('stocks').stream())
+            self.assertEqual([d.to_dict() for d in docs], [{'name': 'Adidas'}])
+            query = backend.get_client().collection('stocks')
+            query = query.where('name', '==', 'Puma')
+            self.assertEqual(list(query.stream()), [])
+        finally:
+            harness.uninstall({'sync': 1.0})
+        self.assertEqual(FakeTicker.calls, 1)
+        self.assertFalse(backend.offline)
+        self.assertIs(yfinance.Ticker, FakeTicker)
+        self.assertEqual(
+            harness.archive.compare({'sync': 1.0, 'filters': 3.0}),
+            {
+                'filters': {'recorded': None, 'replayed': 3.0},
+                'sync': {'recorded': 2.0, 'replayed': 1.0},
+            },
+        )
+
+    def download(self, day, tickers='ADS.F SAP.F'):
+        # start and end of the update depend on the day of the run
+        start = datetime.date(2021, 1, 1)
+        return yfinance.download(
+            tickers=tickers, start=start, end=day, threads=False
+        )
+
+    def test_replay_other_day(self):
+        harness = Harness(Archive(self.path, 'record'), lambda: self.store)
+        harness.install()
+        first = self.download(datetime.date(2021, 3, 1))
+        second = self.download(datetime.date(2021, 3, 2))
+        harness.uninstall()
+        harness = Harness(Archive(self.path, 'replay'))
+        harness.install()
+        try:
+            self.assertEqual(self.download(datetime.date(2022, 5, 1)), first)
+            self.assertEqual(self.download(datetime.date(2022, 5, 1)), second)
+            with self.assertRaises(RuntimeError):
+                self.download(datetime.date(2022, 5, 1), 'BMW.F')
+        finally:
+            harness.uninstall()
+
+    def test_mode(self):
+        with self.assertRaises(ValueError):
+            Archive(self.path, 'write')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.schedule import FundamentalsScheduler  # noqa: E402
+
+SYMBOLS = ['SYM{}.F'.format(idx) for idx in range(200)]
+
+
+class TestFundamentalsScheduler(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.root.name, 'full.sqlite')
+        self.start = datetime.date(2021, 1, 1)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def _scheduler(self, days):
+        return FundamentalsScheduler(
+            self.db_path,
+            max_age=90,
+            spread_days=14,
+            today=self.start + datetime.timedelta(days=days),
+        )
+
+    def test_new_symbols_are_due(self):
+        scheduler = self._scheduler(0)
+        self.assertEqual(scheduler.select(SYMBOLS), SYMBOLS)
+        scheduler.mark(SYMBOLS)
+        self.assertEqual(self._scheduler(1).select(SYMBOLS), [])
+
+    def test_refreshes_are_spread(self):
+        self._scheduler(0).mark(SYMBOLS)
+        refreshed = []
+        for day in range(70, 100):
+            scheduler = self._scheduler(day)
+            due = scheduler.select(SYMBOLS)
+            self.assertLess(len(due), len(SYMBOLS) / 4)
+            scheduler.mark(due)
+            refreshed += due
+        self.assertEqual(sorted(refreshed), sorted(SYMBOLS))
+
+    def test_reset(self):
+        self._scheduler(0).mark(SYMBOLS)
+        scheduler = self._scheduler(1)
+        self.assertEqual(scheduler.select(SYMBOLS), [])
+        scheduler.reset()
+        self.assertEqual(scheduler.select(SYMBOLS), SYMBOLS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import copy
+import logging
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, 'src')
+
+from pony.orm import db_session  # noqa: E402
+from pystockdb.db.schema.stocks import Index  # noqa: E402
+from pystockdb.tools.create import CreateAndFillDataBase  # noqa: E402
+
+from pyfirebasestockscli import SyncFirebaseDB, backend  # noqa: E402
+from pyfirebasestockscli import stock_fields  # noqa: E402
+from pyfirebasestockscli.dryrun import RecordingClient  # noqa: E402
+from pyfirebasestockscli.sharding import (  # noqa: E402
+    ShardMap,
+    chunk_slices,
+    documents_by_name,
+    existing_names,
+    stock_documents,
+)
+
+CONFIG = {
+    'indices': ['DAX'],
+    'currencies': ['EUR', 'USD'],
+    'prices': False,
+    'create': True,
+    'max_history': 1,
+    'db_args': {'provider': 'sqlite', 'filename': ':memory:'},
+}
+
+GROUPS = [
+    ['ADS.F', 'ADDDF'],
+    ['AIR.F', 'EADSF'],
+    ['BMW.F', 'BMWYY'],
+    ['SAP.F', 'SAP'],
+    ['SIE.F', 'SIEGY'],
+]
+
+
+def stock(name, eur, usd, shard=None):
+    doc = {'name': name, 'symbols_eur': [eur], 'symbols_usd': [usd]}
+    if shard is not None:
+        doc['shard'] = shard
+    return doc
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.store = RecordingClient()
+        stocks = self.store.collection('stocks')
+        for doc in (
+            stock('adidas', 'ADS.F', 'ADDDF', 0),
+            stock('Airbus', 'AIR.F', 'EADSF', 0),
+            stock('BMW', 'BMW.F', 'BMWYY', 1),
+            stock('SAP', 'SAP.F', 'SAP'),
+            stock('Siemens', 'SIE.F', 'SIEGY', 2),
+        ):
+            self.store.apply(stocks.document(), doc, False)
+
+    def test_chunk_slices(self):
+        self.assertEqual(chunk_slices(5, 2), [slice(0, 3), slice(3, 6)])
+        self.assertEqual(len(chunk_slices(5, 3)), 3)
+        self.assertEqual(chunk_slices(0, 3), [])
+
+    def test_shard_of(self):
+        shards = ShardMap(GROUPS, 2)
+        self.assertEqual(shards.shard_of(stock('BMW', 'BMW.F', 'BMWYY')), 0)
+        self.assertEqual(shards.shard_of(stock('SAP', 'SAP.F', 'SAP')), 1)
+        # stocks outside of the universe
+        unknown = stock('Bayer', 'BAYN.F', 'BAYRY')
+        self.assertEqual(shards.shard_of(unknown), shards.shard_of(unknown))
+        self.assertIn(shards.shard_of(unknown), (0, 1))
+
+    def test_stock_documents(self):
+        names = [
+            doc.to_dict()['name'] for doc in stock_documents(self.store, 0)
+        ]
+        self.assertEqual(names, ['adidas', 'Airbus'])
+        self.assertEqual(len(list(stock_documents(self.store))), 5)
+        reads = self.store.plan.summary()['collections']['stocks']['reads']
+        self.assertEqual(reads, 7)
+
+    def test_existing_names(self):
+        # BMW and Siemens are missing in shard 0 but have documents
+        names = ['BMW', 'Siemens', 'Bayer']
+        # more names than one query takes
+        names += [f'Stock{idx}' for idx in range(9)]
+        self.assertEqual(
+            existing_names(self.store, names), {'BMW', 'Siemens'}
+        )
+        self.assertEqual(existing_names(self.store, []), set())
+        self.assertEqual(list(documents_by_name(self.store, [])), [])
+
+    def test_moves(self):
+        # one node less
+        shards = ShardMap(GROUPS, 2)
+        moves = shards.moves(stock_documents(self.store))
+        self.assertEqual(
+            [
+                (snapshot.to_dict()['name'], update)
+                for snapshot, update in moves
+            ],
+            [
+                ('BMW', {'shard': 0}),
+                ('SAP', {'shard': 1}),
+                ('Siemens', {'shard': 1}),
+            ],
+        )
+        # a second rebalance has nothing to move
+        batch = self.store.batch()
+        for snapshot, update in moves:
+            batch.set(snapshot.reference, update, merge=True)
+        batch.commit()
+        self.assertEqual(shards.moves(stock_documents(self.store)), [])
+
+
+class TestShardedSync(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('test')
+        CreateAndFillDataBase(copy.deepcopy(CONFIG), self.logger).build()
+        self.store = RecordingClient()
+        stocks = self.store.collection('stocks')
+        with db_session:
+            members = list(Index.get(name='DAX').stocks)[:2]
+            self.names = [stock.name for stock in members]
+            self.symbols = [
+                sym.name
+                for stock in members
+                for sym in stock.price_item.symbols
+            ]
+            # the second stock was synced by node 1 before a node was added
+            for shard, stock in enumerate(members):
+                doc = dict(stock_fields(stock), shard=shard)
+                self.store.apply(stocks.document(), doc, False)
+        backend.use_client(self.store)
+
+    def tearDown(self):
+        backend.use_client(None)
+
+    def test_moved_documents(self):
+        with mock.patch('pyfirebasestockscli.init_app'):
+            sync = SyncFirebaseDB(
+                databaseURL='url',
+                cred_json='cred.json',
+                logger=self.logger,
+                shard=0,
+            )
+        with self.assertLogs(self.logger, 'WARNING') as logs:
+            sync.build(self.symbols)
+        self.assertIn('1 stocks are in another shard', logs.output[0])
+        docs = {
+            doc.to_dict()['name']: doc.to_dict()
+            for doc in stock_documents(self.store)
+        }
+        self.assertEqual(sorted(docs), sorted(self.names))
+        for doc in docs.values():
+            self.assertIn('date', doc)
+        # the moved document stays in its shard until the rebalance
+        self.assertEqual(docs[self.names[1]]['shard'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, 'src')
+
+import pyfirebasestockscli  # noqa: E402
+from pyfirebasestockscli.stages import StageGraph  # noqa: E402
+
+ALL = ['job', 'prices', 'fundamentals', 'filters', 'sync']
+
+
+class TestStageGraph(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.graph = StageGraph()
+        self.graph.add(
+            'job', self.stage('job', symbols=['ADS.F']),
+            outputs=['symbols'], cheap=True,
+        )
+        self.graph.add(
+            'prices', self.stage('prices', prices=True),
+            inputs=['symbols'], outputs=['prices'],
+        )
+        self.graph.add(
+            'fundamentals', self.stage('fundamentals', fundamentals=True),
+            inputs=['symbols'], outputs=['fundamentals'],
+        )
+        self.graph.add(
+            'filters', self.stage('filters', signals=True),
+            inputs=['prices', 'fundamentals', 'symbols'],
+            outputs=['signals'],
+        )
+        self.graph.add(
+            'sync', self.stage('sync'), inputs=['signals', 'symbols']
+        )
+
+    def stage(self, name, **outputs):
+        def func(context):
+            with self.lock:
+                self.calls.append(name)
+            return outputs
+
+        return func
+
+    def test_all(self):
+        context = {}
+        self.assertEqual(self.graph.run(context, ALL), ALL)
+        self.assertEqual(self.calls, ALL)
+        self.assertEqual(context['symbols'], ['ADS.F'])
+
+    def test_only(self):
+        # cheap stages are added
+        self.assertEqual(self.graph.run({}, ALL, only=['sync']), ['job', 'sync'])
+
+    def test_from(self):
+        self.assertEqual(
+            self.graph.run({}, ALL, start='filters'),
+            ['job', 'filters', 'sync'],
+        )
+
+    def test_requires(self):
+        sync = self.graph.get('sync')
+        self.assertTrue(self.graph.requires(sync, 'prices'))
+        self.assertTrue(self.graph.requires(sync, 'symbols'))
+        self.assertFalse(self.graph.requires(self.graph.get('job'), 'prices'))
+        self.assertFalse(self.graph.requires(sync, 'database'))
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self.graph.run, {}, ALL, ['foo'])
+
+    def test_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def parallel(name, output):
+            def func(context):
+                # prices and fundamentals have to run at the same time
+                barrier.wait()
+                return {output: True}
+
+            return func
+
+        self.graph.stages[1].func = parallel('prices', 'prices')
+        self.graph.stages[2].func = parallel('fundamentals', 'fundamentals')
+        self.assertEqual(self.graph.run({}, ALL, workers=2), ALL)
+        self.assertEqual(self.calls, ['job', 'filters', 'sync'])
+
+
+class TestPartialRerun(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.root.name, 'full.sqlite')
+        self.calls = []
+        self.graph = pyfirebasestockscli.build_stage_graph(None)
+        for stage in self.graph.stages:
+            stage.func = self.stage(stage.name, stage.outputs)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def stage(self, name, outputs):
+        def func(context):
+            self.calls.append(name)
+            return {output: True for output in outputs}
+
+        return func
+
+    def bind(self, db_args):
+        self.calls.append(('bind', db_args['filename']))
+
+    def run_app(self, *args):
+        env = {'DATABASE_URL': 'url', 'CRED_JSON': 'cred', 'DATA_ROOT': 'data'}
+        with mock.patch.dict(os.environ, env), mock.patch.object(
+            pyfirebasestockscli, 'bind_database', self.bind
+        ), mock.patch.object(
+            pyfirebasestockscli,
+            'build_stage_graph',
+            lambda logger, profiler=None: self.graph,
+        ):
+            self.assertEqual(
+                pyfirebasestockscli.app([*args, '--db', self.db_path]), 0
+            )
+
+    def test_only(self):
+        # the database stage is skipped, sync still needs the database
+        self.run_app('--only', 'sync')
+        self.assertEqual(self.calls, [('bind', self.db_path), 'job', 'sync'])
+
+    def test_without_database(self):
+        self.run_app('-t')
+        self.run_app('-s')
+        self.run_app()
+        self.assertEqual(self.calls, ['tags', 'strategies'])
+        # neither the database nor the price arrays are created
+        self.assertEqual(os.listdir(self.root.name), [])
+
+    def test_from(self):
+        self.run_app('-u', '--from', 'filters')
+        self.assertEqual(
+            self.calls,
+            [('bind', self.db_path), 'job', 'filters', 'missing', 'sync'],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pyfirebasestockscli
+
+  Copyright 2019 Slash Gordon
+
+  Use of this source code is governed by an MIT-style license that
+  can be found in the LICENSE file.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, 'src')
+
+from pyfirebasestockscli.universe import UniverseCache  # noqa: E402
+
+
+class FakeStockData:
+    def __init__(self):
+        self.calls = 0
+
+    def get_yahoo_ticker_symbols_by_index(self, index):
+        self.calls += 1
+        return {
+            'DAX': [['ADS.F', 'ADDDF'], ['BMW.F', 'BMWYY']],
+            'EURO STOXX 50': [['ADS.F', 'ADDDF'], ['AIR.F', 'EADSF']],
+        }[index]
+
+    def index_to_yahoo_symbol(self, index):
+        return {'DAX': '^GDAXI', 'EURO STOXX 50': '^STOXX50E'}[index]
+
+
+class TestUniverseCache(unittest.TestCase):
+    def test_cache(self):
+        indices = ['DAX', 'EURO STOXX 50']
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'universe.json')
+            stock_data = FakeStockData()
+            data = UniverseCache(path).load(indices, stock_data)
+            self.assertEqual(
+                data['groups'],
+                [['ADS.F', 'ADDDF'], ['AIR.F', 'EADSF'], ['BMW.F', 'BMWYY']],
+            )
+            self.assertEqual(
+                data['fra_groups'], [['ADS.F'], ['AIR.F'], ['BMW.F']]
+            )
+            self.assertEqual(data['index_symbols'], ['^GDAXI', '^STOXX50E'])
+            self.assertEqual(stock_data.calls, 2)
+            # second load is served from file
+            cached = UniverseCache(path).load(indices, stock_data)
+            self.assertEqual(stock_data.calls, 2)
+            self.assertEqual(cached['groups'], data['groups'])
+            # other indices invalidate the cache
+            UniverseCache(path).load(['DAX'], stock_data)
+            self.assertEqual(stock_data.calls, 3)
+
+    def test_write_error(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'missing', 'universe.json')
+            with self.assertLogs('firebase', level='WARNING') as logs:
+                data = UniverseCache(path).load(['DAX'], FakeStockData())
+            self.assertEqual(len(data['groups']), 2)
+            self.assertIn("Couldn't write universe cache", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()